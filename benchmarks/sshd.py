@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+    sshd
+    ~~~~
+
+    In-process SSH server standing in for remote hosts while benchmarking,
+    replying to every command with a fixed size output after an artificial latency.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import time
+import socket
+import logging
+import paramiko
+import threading
+
+logger = logging.getLogger('sshd')
+
+class Handler(paramiko.ServerInterface):
+    
+    """Accept any password and execute every command in a thread of its own."""
+    
+    def __init__(self, server):
+        self.server = server
+    
+    def get_allowed_auths(self, username):
+        return 'password'
+    
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+    
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+    
+    def check_channel_exec_request(self, channel, command):
+        worker = threading.Thread(target=self.server.execute, args=(channel, command))
+        worker.daemon = True
+        worker.start()
+        return True
+
+class SSHServer(threading.Thread):
+    
+    """SSH server listening on a random local port.
+    
+    Only exec requests are supported, hence channels must use default exec mode.
+    
+    """
+    
+    def __init__(self, latency=0.0, size=64):
+        """Initialize SSH server.
+        
+        Kwargs:
+            latency (float): Seconds to wait before replying to a command.
+            size (int): Bytes of stdout replied to every command.
+        
+        """
+        super(SSHServer, self).__init__()
+        self.daemon = True
+        self.latency = latency
+        self.payload = ('x' * 63 + '\n') * (size // 64) + 'x' * (size % 64)
+        self.key = paramiko.RSAKey.generate(2048)
+        self.transports = list()
+        
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+    
+    def execute(self, channel, command):
+        """Reply to a command after configured latency.
+        
+        Channel is only half closed, as a close racing ahead of exec request acknowledgement fails the request.
+        Client closes the channel once it has read the output.
+        
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        channel.sendall(self.payload)
+        channel.send_exit_status(0)
+        channel.shutdown_write()
+    
+    def run(self):
+        while True:
+            try:
+                conn, addr = self.sock.accept()
+            except socket.error:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.key)
+            transport.start_server(server=Handler(self))
+            self.transports.append(transport)
+    
+    def stop(self):
+        """Stop accepting connections and close existing ones."""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.sock.close()
+        for transport in self.transports:
+            transport.close()
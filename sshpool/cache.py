@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.cache
+    ~~~~~~~~~~~~~
+
+    This module provides a bounded cache of command outputs,
+    allowing repeated idempotent commands to skip SSH round-trips.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import re
+import time
+import threading
+import collections
+
+class Cache(object):
+    
+    """LRU cache of successful command outputs keyed on (alias, command), expiring after a TTL.
+    
+    Cache is bounded both by number of entries and total bytes of cached output.
+    
+    """
+    
+    def __init__(self, ttl=60, max_entries=1024, max_bytes=16 * 1024 * 1024, allow=None):
+        """Initialize a new cache.
+        
+        Kwargs:
+            ttl (float): Default seconds after which a cached output expires.
+            max_entries (int): Maximum number of cached outputs.
+            max_bytes (int): Maximum total bytes of cached outputs.
+            allow (list): Regular expressions, commands matching any of them are cached without being asked for.
+        
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.allow = [re.compile(pattern) for pattern in allow or list()]
+        
+        self.entries = collections.OrderedDict()
+        self.bytes = 0
+        self.stats = dict()
+        self.lock = threading.Lock()
+    
+    def allowed(self, cmd):
+        """Whether cmd matches allow list."""
+        return any(pattern.match(cmd) for pattern in self.allow)
+    
+    def count(self, alias, stat):
+        """Increment hits or misses counter of alias. Must be called with lock held."""
+        if alias not in self.stats:
+            self.stats[alias] = {'hits': 0, 'misses': 0}
+        self.stats[alias][stat] += 1
+    
+    def discard(self, key):
+        """Remove a cached output. Must be called with lock held."""
+        expires, size, resp = self.entries.pop(key)
+        self.bytes -= size
+    
+    def get(self, alias, cmd):
+        """Lookup cached output of cmd executed over alias.
+        
+        Returns:
+            dict. None if output is not cached or has expired.
+        
+        """
+        key = (alias, cmd)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                self.discard(key)
+                entry = None
+            if entry is None:
+                self.count(alias, 'misses')
+                return None
+            self.entries.pop(key)
+            self.entries[key] = entry
+            self.count(alias, 'hits')
+            return entry[2]
+    
+    def put(self, alias, cmd, resp, ttl=None):
+        """Cache output of cmd executed over alias, evicting least recently used outputs beyond bounds.
+        
+        Only outputs of successfully executed commands are cached.
+        
+        Kwargs:
+            ttl (float): Seconds after which output expires, defaults to ttl of the cache.
+        
+        """
+        if resp.get('exit_code') != 0:
+            return
+        
+        size = len(cmd) + len(resp.get('stdout') or '') + len(resp.get('stderr') or '')
+        if size > self.max_bytes:
+            return
+        
+        key = (alias, cmd)
+        expires = time.time() + (ttl or self.ttl)
+        with self.lock:
+            if key in self.entries:
+                self.discard(key)
+            self.entries[key] = (expires, size, resp)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.discard(next(iter(self.entries)))
+    
+    def invalidate(self, alias):
+        """Remove all cached outputs of alias."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == alias]:
+                self.discard(key)
+    
+    def info(self, alias):
+        """Hits and misses counters of alias.
+        
+        Returns:
+            dict.
+        
+        """
+        with self.lock:
+            return dict(self.stats.get(alias, {'hits': 0, 'misses': 0}))
@@ -9,8 +9,33 @@
     :copyright: (c) 2013 by Abhinav Singh.
     :license: BSD, see LICENSE for more details.
 """
+import re
+import json
+import socket
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+from .shard import ShardMap
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from urllib.parse import quote, unquote, urlparse
+except ImportError:
+    from urllib import quote, unquote
+    from urlparse import urlparse
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
 
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
 logger = logging.getLogger('sshpool.client')
@@ -18,21 +43,184 @@ logger = logging.getLogger('sshpool.client')
 requests_connpool_logger = logging.getLogger('requests.packages.urllib3.connectionpool')
 requests_connpool_logger.setLevel(logging.WARNING)
 
+class UnixConnection(HTTPConnection):
+    
+    """HTTP connection over a Unix domain socket."""
+    
+    def __init__(self, path, **kwargs):
+        HTTPConnection.__init__(self, 'localhost', **kwargs)
+        self.socket_path = path
+    
+    def connect(self):
+        """Connect to Unix domain socket instead of a TCP address."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error:
+            sock.close()
+            raise
+        self.sock = sock
+
+class UnixConnectionPool(HTTPConnectionPool):
+    
+    """Pool of keep-alive HTTP connections over a Unix domain socket."""
+    
+    def __init__(self, path, **kwargs):
+        HTTPConnectionPool.__init__(self, 'localhost', **kwargs)
+        self.socket_path = path
+    
+    def _new_conn(self):
+        self.num_connections += 1
+        return UnixConnection(self.socket_path, timeout=self.timeout.connect_timeout)
+
+class UnixAdapter(HTTPAdapter):
+    
+    """Transport adapter for http+unix:// URLs, whose host is the percent encoded path of a Unix domain socket."""
+    
+    def __init__(self, pool_maxsize=10):
+        self.pools = dict()
+        self.pools_lock = threading.Lock()
+        HTTPAdapter.__init__(self, pool_connections=1, pool_maxsize=pool_maxsize)
+    
+    def get_connection(self, url, proxies=None):
+        """Lookup connection pool of Unix domain socket addressed by url, creating it upon first use."""
+        path = unquote(urlparse(url).netloc)
+        with self.pools_lock:
+            pool = self.pools.get(path)
+            if pool is None:
+                pool = self.pools[path] = UnixConnectionPool(path, maxsize=self._pool_maxsize)
+            return pool
+    
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        """Same lookup as get_connection, TLS does not apply to Unix domain sockets."""
+        return self.get_connection(request.url, proxies)
+    
+    def close(self):
+        """Close connections of all Unix domain socket pools."""
+        with self.pools_lock:
+            for pool in self.pools.values():
+                pool.close()
+            self.pools.clear()
+        HTTPAdapter.close(self)
+
 class Client(object):
     
-    """SSH channel REST API client."""
+    """SSH channel REST API client.
+    
+    Requests are sent over a pool of keep-alive HTTP connections, hence a single
+    client instance can be shared by many threads.
+    
+    Given a shard map, aliases are spread over many sshpoold instances by consistent hashing.
+    Requests about an alias go to the instance owning it, while status, fanout and jobs span all of them.
+    
+    """
     
-    def __init__(self, host, port):
+    # Resources scoped to a channel, routed to shard owning its alias.
+    alias_re = re.compile(r'^/channels/([^/]+)')
+    
+    def __init__(self, host, port, pool_size=10, timeout=None, shards=None):
         """Initialize REST API client.
         
         Args:
-            host (str): SSHPool server interface
-            port (int): SSHPool server port
+            host (str): SSHPool server interface, or unix:// followed by path of its Unix domain socket.
+            port (int): SSHPool server port, ignored for Unix domain sockets.
+        
+        Kwargs:
+            pool_size (int): Maximum number of HTTP connections kept alive with each SSHPool server.
+            timeout (float or tuple): Seconds to wait for server to accept connection and respond,
+                either a single value or a (connect, read) tuple. Waits forever by default.
+            shards (list or str): Addresses of sshpoold instances e.g. 127.0.0.1:8877 or unix:///run/sshpool.sock, each owning a shard
+                of aliases, or path of a shard map file listing one address per line. Host and port are
+                ignored when given, see reload.
         
         """
         self.host = host
         self.port = port
-        self.base_url = 'http://%s:%s' % (self.host, self.port)
+        self.base_url = Client.base(host if host and host.startswith('unix://') else '%s:%s' % (host, port))
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.shard_map = ShardMap(shards) if shards else None
+        self.session = requests.Session()
+        self.mount()
+    
+    def mount(self):
+        """Keep a pool of HTTP connections alive with every SSHPool server."""
+        self.session.mount('http://', HTTPAdapter(pool_connections=len(self.shards()), pool_maxsize=self.pool_size))
+        self.session.mount('http+unix://', UnixAdapter(pool_maxsize=self.pool_size))
+    
+    @staticmethod
+    def base(address):
+        """Build base URL of SSHPool server listening on address.
+        
+        Args:
+            address (str): host:port, or unix:// followed by path of a Unix domain socket.
+        
+        Returns:
+            str.
+        
+        """
+        if address.startswith('unix://'):
+            return 'http+unix://%s' % quote(address[len('unix://'):], safe='')
+        return 'http://%s' % address
+    
+    def reload(self):
+        """Reload shard map, e.g. after a sshpoold instance has been added to shard map file.
+        
+        Only aliases moving to or from added or removed instances are routed elsewhere afterwards.
+        
+        Returns:
+            bool. Whether shards have changed.
+        
+        """
+        if self.shard_map is None or not self.shard_map.reload():
+            return False
+        self.mount()
+        return True
+    
+    def shards(self):
+        """List base URLs of all SSHPool servers.
+        
+        Returns:
+            list.
+        
+        """
+        if self.shard_map is None:
+            return [self.base_url]
+        return [Client.base(shard) for shard in self.shard_map.shards]
+    
+    def route(self, alias):
+        """Lookup base URL of SSHPool server owning alias.
+        
+        Returns:
+            str.
+        
+        """
+        if self.shard_map is None or not alias:
+            return self.base_url
+        return Client.base(self.shard_map.shard(alias))
+    
+    def each(self, call):
+        """Call call with base URL of every SSHPool server, concurrently.
+        
+        Returns:
+            list. Tuples of base URL and what call returned for it.
+        
+        """
+        shards = self.shards()
+        if len(shards) == 1:
+            return [(shards[0], call(shards[0]))]
+        
+        results = [None] * len(shards)
+        
+        def work(i):
+            results[i] = call(shards[i])
+        threads = [threading.Thread(target=work, args=(i, )) for i in range(len(shards))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return list(zip(shards, results))
     
     def status(self, alias):
         """Retrieve meta info about all initialized SSH channels.
@@ -41,10 +229,35 @@ class Client(object):
             alias (str): If provided retrieve meta info for specific SSH channel.
         
         Returns:
-            requests.get.
+            requests.get. Meta info of channels of all shards merged, shards which failed to respond
+            are listed in X-Failed-Shards header.
         
         """
-        return self.get('/channels/%s' % alias) if alias else self.get('/channels')
+        if alias:
+            return self.get('/channels/%s' % alias)
+        if self.shard_map is None:
+            return self.get('/channels')
+        
+        channels, failed, last = dict(), list(), None
+        for shard, r in self.each(lambda shard: self.get('/channels', shard=shard)):
+            if r is not None and r.status_code == 200:
+                channels.update(r.json())
+                last = r
+            else:
+                logger.warning('unable to retrieve status of shard %s' % shard)
+                failed.append(shard)
+        if last is None:
+            return r
+        
+        merged = requests.Response()
+        merged.status_code = 200
+        merged.url = last.url
+        merged.encoding = 'utf-8'
+        merged.headers['Content-Type'] = 'application/json'
+        if failed:
+            merged.headers['X-Failed-Shards'] = ', '.join(failed)
+        merged._content = json.dumps(channels).encode('utf-8')
+        return merged
     
     def start(self, channel):
         """Start a new SSH channel.
@@ -56,20 +269,302 @@ class Client(object):
             requests.post.
         
         """
-        return self.post('/channels', channel)
+        return self.post('/channels', channel, shard=self.route(channel.split('://')[0]))
     
-    def run(self, alias, cmd):
+    def run(self, alias, cmd, timeout=None, tag=None):
         """Run arbitrary shell command over a SSH channel.
         
         Args:
             alias (str): Channel alias.
             cmd (str): Command to execute.
         
+        Kwargs:
+            timeout (float): Seconds after which command is aborted, defaults to timeout of the channel.
+            tag (str): Name to abort command with while it runs, see abort.
+        
+        Returns:
+            requests.post.
+        
+        """
+        return self.post('/channels/%s' % alias, cmd, **self.options(timeout, tag))
+    
+    def stream(self, alias, cmd, timeout=None, tag=None):
+        """Run arbitrary shell command over a SSH channel and iterate over its output as it arrives.
+        
+        Args:
+            alias (str): Channel alias.
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            timeout, tag: Same as run.
+        
+        Yields:
+            dict. Chunks of output keyed by stdout or stderr, followed by a dictionary containing exit code.
+        
+        """
+        options = self.options(timeout, tag)
+        options.setdefault('params', dict())['stream'] = 1
+        r = self.post('/channels/%s' % alias, cmd, stream=True, **options)
+        for resp in self.frames(r):
+            yield resp
+    
+    def raw(self, alias, cmd, stream='stdout'):
+        """Run arbitrary shell command over a SSH channel and receive one of its outputs as is, without JSON encoding.
+        
+        Args:
+            alias (str): Channel alias.
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            stream (str): stdout or stderr.
+        
+        Returns:
+            requests.post. Body is not read upfront, iterate over iter_content to consume large outputs.
+            Exit code of command is in X-Exit-Code header.
+        
+        """
+        return self.post('/channels/%s' % alias, cmd, params={'raw': stream}, stream=True)
+    
+    def batch(self, alias, cmds, stop_on_failure=False, timeout=None):
+        """Run a list of shell commands one after another over a SSH channel.
+        
+        Args:
+            alias (str): Channel alias.
+            cmds (list): Commands to execute.
+        
+        Kwargs:
+            stop_on_failure (bool): Skip remaining commands once a command exits with non-zero exit code.
+            timeout (float): Seconds after which whole batch is aborted, defaults to timeout of the channel.
+        
         Returns:
             requests.post.
         
         """
-        return self.post('/channels/%s' % alias, cmd)
+        return self.post('/channels/%s/batch' % alias, json.dumps({'commands': cmds, 'stop_on_failure': stop_on_failure, 'timeout': timeout}))
+    
+    def fanout(self, cmd, aliases=None, select=None, concurrency=None, deadline=None):
+        """Run arbitrary shell command over many SSH channels in parallel.
+        
+        Args:
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            aliases (list): Channel aliases.
+            select (str): Glob pattern matching channel aliases e.g. web*.
+            concurrency (int): Maximum number of channels executing command at a time.
+            deadline (float): Seconds after which channels yet to respond are reported as timed out.
+        
+        Yields:
+            dict. Output of executed command along with alias of the channel, in order of completion.
+        
+        """
+        params = {
+            'cmd': cmd,
+            'aliases': aliases,
+            'select': select,
+            'concurrency': concurrency,
+            'deadline': deadline,
+        }
+        if self.shard_map is None:
+            r = self.post('/fanout', json.dumps(params), stream=True)
+            for resp in self.frames(r):
+                yield resp
+            return
+        
+        # every shard fans out to its own aliases, concurrency applies to each shard on its own
+        if aliases:
+            owned = dict()
+            for alias in aliases:
+                owned.setdefault(self.route(alias), list()).append(alias)
+            calls = [(shard, dict(params, aliases=owned[shard])) for shard in owned]
+        else:
+            calls = [(shard, params) for shard in self.shards()]
+        
+        responses = queue.Queue()
+        
+        def work(shard, params):
+            try:
+                r = self.post('/fanout', json.dumps(params), stream=True, shard=shard)
+                if r is None:
+                    exception = 'shard %s unreachable' % shard
+                    for resp in [{'alias': alias, 'exception': exception} for alias in params.get('aliases') or []] or [{'exception': exception}]:
+                        responses.put(resp)
+                for resp in self.frames(r):
+                    responses.put(resp)
+            finally:
+                responses.put(None)
+        for shard, params in calls:
+            worker = threading.Thread(target=work, args=(shard, params))
+            worker.daemon = True
+            worker.start()
+        
+        pending = len(calls)
+        while pending:
+            resp = responses.get()
+            if resp is None:
+                pending -= 1
+            else:
+                yield resp
+    
+    def stat(self, alias, path):
+        """Lookup size and modification time of a remote file.
+        
+        Args:
+            alias (str): Channel alias.
+            path (str): Remote file path.
+        
+        Returns:
+            requests.head. Size is in Content-Length and modification time in Last-Modified header.
+        
+        """
+        return self.head('/channels/%s/files' % alias, params={'path': path})
+    
+    def download(self, alias, path, offset=0, length=None):
+        """Download a remote file over SFTP.
+        
+        Args:
+            alias (str): Channel alias.
+            path (str): Remote file path.
+        
+        Kwargs:
+            offset (int): Position to start downloading from, negative to download last these many bytes.
+            length (int): Maximum bytes to download, until end of file by default.
+        
+        Returns:
+            requests.get. Body is not read upfront, iterate over iter_content to consume large files.
+        
+        """
+        headers = dict()
+        if offset < 0:
+            headers['Range'] = 'bytes=%d' % offset
+        elif offset or length is not None:
+            headers['Range'] = 'bytes=%d-%s' % (offset, '' if length is None else offset + length - 1)
+        return self.get('/channels/%s/files' % alias, params={'path': path}, headers=headers, stream=True)
+    
+    def upload(self, alias, path, data, offset=0):
+        """Upload a remote file over SFTP.
+        
+        Args:
+            alias (str): Channel alias.
+            path (str): Remote file path.
+            data (str, file or iterable): File content, streamed as it is read.
+        
+        Kwargs:
+            offset (int): Write data at this position of remote file, which must not be beyond its end.
+        
+        Returns:
+            requests.put. JSON dict with size of remote file.
+        
+        """
+        return self.put('/channels/%s/files' % alias, data, params={'path': path, 'offset': offset})
+    
+    def resume(self, alias, path, f):
+        """Upload a local file, skipping bytes already present in remote file by a previously interrupted upload.
+        
+        Args:
+            alias (str): Channel alias.
+            path (str): Remote file path.
+            f (file): Local file opened in binary mode.
+        
+        Returns:
+            requests.put.
+        
+        """
+        r = self.stat(alias, path)
+        offset = int(r.headers['Content-Length']) if r is not None and r.status_code == 200 else 0
+        f.seek(offset)
+        return self.upload(alias, path, f, offset)
+    
+    def abort(self, alias, tag):
+        """Abort a command running over a SSH channel, closing its SSH session.
+        
+        Args:
+            alias (str): Channel alias.
+            tag (str): Tag command was run with.
+        
+        Returns:
+            requests.delete.
+        
+        """
+        return self.delete('/channels/%s/commands/%s' % (alias, tag))
+    
+    def submit(self, alias, cmd, timeout=None):
+        """Queue a shell command for asynchronous execution over a SSH channel.
+        
+        Args:
+            alias (str): Channel alias.
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            timeout (float): Seconds after which job is aborted, defaults to timeout of the channel.
+        
+        Returns:
+            requests.post. Responds with 202 and job meta info, or 429 with Retry-After header if job queue is full.
+        
+        """
+        return self.post('/channels/%s/jobs' % alias, cmd, **self.options(timeout))
+    
+    def job(self, job_id, wait=None, alias=None):
+        """Retrieve meta info of a job, along with its result once finished.
+        
+        Args:
+            job_id (str): Job id as returned by submit.
+        
+        Kwargs:
+            wait (float): Seconds to hold response until job finishes.
+            alias (str): Alias job was submitted to, saves looking up job over all shards.
+        
+        Returns:
+            requests.get.
+        
+        """
+        return self.get('/jobs/%s' % job_id, params={'wait': wait} if wait else None, shard=self.locate(job_id, alias))
+    
+    def watch(self, job_id, alias=None):
+        """Iterate over states of a job as it changes, until it finishes.
+        
+        Args:
+            job_id (str): Job id as returned by submit.
+        
+        Kwargs:
+            alias (str): Same as job.
+        
+        Yields:
+            dict. Job meta info, last one carrying result of the job.
+        
+        """
+        r = self.get('/jobs/%s' % job_id, params={'stream': 1}, stream=True, shard=self.locate(job_id, alias))
+        for resp in self.frames(r):
+            yield resp
+    
+    def cancel(self, job_id, alias=None):
+        """Forget a job along with its result, cancelling it if yet to be executed.
+        
+        Args:
+            job_id (str): Job id as returned by submit.
+        
+        Kwargs:
+            alias (str): Same as job.
+        
+        Returns:
+            requests.delete.
+        
+        """
+        return self.delete('/jobs/%s' % job_id, shard=self.locate(job_id, alias))
+    
+    def locate(self, job_id, alias=None):
+        """Lookup base URL of SSHPool server a job was submitted to, asking every shard unless alias is known.
+        
+        Returns:
+            str. Base URL of first shard when job is not known to any of them.
+        
+        """
+        if alias or self.shard_map is None:
+            return self.route(alias)
+        for shard, r in self.each(lambda shard: self.head('/jobs/%s' % job_id, shard=shard)):
+            if r is not None and r.status_code == 200:
+                return shard
+        return self.shards()[0]
     
     def stop(self, alias):
         """Stop/terminate a SSH channel.
@@ -83,62 +578,319 @@ class Client(object):
         """
         return self.delete('/channels/%s' % alias)
     
-    def url(self, resource):
+    @staticmethod
+    def options(timeout=None, tag=None):
+        """Query parameters and headers carrying timeout and tag of a command.
+        
+        Returns:
+            dict. Keyword arguments for post.
+        
+        """
+        options = dict()
+        if timeout:
+            options['params'] = {'timeout': timeout}
+        if tag:
+            options['headers'] = {'X-Request-Id': tag}
+        return options
+    
+    def frames(self, r):
+        """Iterate over JSON dicts of a NDJSON response, releasing its connection once done.
+        
+        Args:
+            r (requests.Response): Streamed response
+        
+        Yields:
+            dict.
+        
+        """
+        if r is None:
+            return
+        
+        try:
+            if r.status_code != 200:
+                yield {'exception': 'HTTP %s' % r.status_code}
+                return
+            
+            for line in r.iter_lines():
+                if line:
+                    yield json.loads(line)
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError) as e:
+            yield {'exception': 'response cut short: %s' % e}
+        finally:
+            r.close()
+    
+    def close(self):
+        """Close all HTTP connections kept alive with SSHPool server."""
+        self.session.close()
+    
+    def url(self, resource, shard=None):
         """Return full API url for specified resource.
         
         Args:
             resource (str): API resource
         
+        Kwargs:
+            shard (str): Base URL of SSHPool server to address, server owning alias of resource by default.
+        
         Returns:
             str.
         
         """
-        return '%s%s' % (self.base_url, resource)
+        if shard is None:
+            match = Client.alias_re.match(resource)
+            shard = self.route(match.group(1) if match else None)
+        return '%s%s' % (shard, resource)
     
-    def get(self, resource):
-        """Wrapper over requests.get.
+    def get(self, resource, shard=None, **kwargs):
+        """Wrapper over requests.Session.get.
         
         Args:
             resource (str): API resource
         
+        Kwargs:
+            shard (str): Same as url.
+            Others are passed as is to requests.Session.get.
+        
         Returns:
             requests.get.
         
         """
         try:
-            return requests.get(self.url(resource))
-        except requests.exceptions.ConnectionError as e:
+            return self.session.get(self.url(resource, shard), timeout=self.timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             print(e)
             return None
     
-    def post(self, resource, data):
-        """Wrapper over requests.post.
+    def post(self, resource, data, shard=None, **kwargs):
+        """Wrapper over requests.Session.post.
         
         Args:
             resource (str): API resource
         
+        Kwargs:
+            shard (str): Same as url.
+            Others are passed as is to requests.Session.post.
+        
         Returns:
             requests.post.
         
         """
         try:
-            return requests.post(self.url(resource), data=data)
-        except requests.exceptions.ConnectionError as e:
+            return self.session.post(self.url(resource, shard), data=data, timeout=self.timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             print(e)
             return None
     
-    def delete(self, resource):
-        """Wrapper over requests.delete.
+    def head(self, resource, shard=None, **kwargs):
+        """Send a HEAD request, see requests.Session.head.
         
         Args:
             resource (str): API resource
         
+        Kwargs:
+            shard (str): Same as url.
+            Others are passed as is to requests.Session.head.
+        
+        Returns:
+            requests.head.
+        
+        """
+        try:
+            return self.session.head(self.url(resource, shard), timeout=self.timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            print(e)
+            return None
+    
+    def put(self, resource, data, shard=None, **kwargs):
+        """Send a PUT request, see requests.Session.put.
+        
+        Args:
+            resource (str): API resource
+        
+        Kwargs:
+            shard (str): Same as url.
+            Others are passed as is to requests.Session.put.
+        
+        Returns:
+            requests.put.
+        
+        """
+        try:
+            return self.session.put(self.url(resource, shard), data=data, timeout=self.timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            print(e)
+            return None
+    
+    def delete(self, resource, shard=None):
+        """Wrapper over requests.Session.delete.
+        
+        Args:
+            resource (str): API resource
+        
+        Kwargs:
+            shard (str): Same as url.
+        
         Returns:
             requests.delete.
         
         """
         try:
-            return requests.delete(self.url(resource))
-        except requests.exceptions.ConnectionError as e:
+            return self.session.delete(self.url(resource, shard), timeout=self.timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             print(e)
             return None
+
+class Future(object):
+    
+    """Outcome of an AsyncClient call, for applications running without asyncio."""
+    
+    def __init__(self):
+        self.finished = threading.Event()
+        self.value = None
+        self.error = None
+    
+    def set(self, value=None, error=None):
+        """Record outcome of the call, waking up whoever waits for it."""
+        self.value, self.error = value, error
+        self.finished.set()
+    
+    def done(self):
+        """Whether call has finished."""
+        return self.finished.is_set()
+    
+    def result(self, timeout=None):
+        """Wait for the call to finish.
+        
+        Kwargs:
+            timeout (float): Seconds to wait for, forever by default.
+        
+        Returns:
+            Return value of the call. Exception raised by the call is raised again, RuntimeError if it is yet to finish.
+        
+        """
+        if not self.finished.wait(timeout):
+            raise RuntimeError('call still in flight after %s seconds' % timeout)
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+class AsyncClient(object):
+    
+    """SSH channel REST API client for asyncio applications.
+    
+    Exposes same API as Client, except that every call returns an awaitable, or a Future when asyncio is not available.
+    Calls are executed by a pool of threads sharing keep-alive HTTP connections,
+    allowing up to concurrency calls in flight at a time.
+    
+    """
+    
+    def __init__(self, host, port, concurrency=16, timeout=None, loop=None, shards=None):
+        """Initialize asyncio REST API client.
+        
+        Args:
+            host (str): Same as Client.
+            port (int): Same as Client.
+        
+        Kwargs:
+            concurrency (int): Maximum number of calls in flight and HTTP connections kept alive,
+                keep it within number of workers of sshpoold.
+            timeout (float or tuple): Same as Client.
+            loop (asyncio.AbstractEventLoop): Event loop to use, current event loop by default.
+            shards (list or str): Same as Client.
+        
+        """
+        self.client = Client(host, port, pool_size=concurrency, timeout=timeout, shards=shards)
+        self.concurrency = concurrency
+        self.calls = queue.Queue()
+        self.workers = list()
+        self.lock = threading.Lock()
+        self.loop = loop
+    
+    def call(self, method, *args):
+        """Schedule a blocking Client call over thread pool, starting another thread unless concurrency is reached.
+        
+        Returns:
+            asyncio.Future, a Future if asyncio is not available.
+        
+        """
+        if asyncio is None:
+            future = Future()
+            resolve = future.set
+        else:
+            loop = self.loop or asyncio.get_event_loop()
+            future = asyncio.Future(loop=loop)
+            
+            def resolve(value=None, error=None):
+                loop.call_soon_threadsafe(AsyncClient.settle, future, value, error)
+        self.calls.put((method, args, resolve))
+        with self.lock:
+            if len(self.workers) < self.concurrency:
+                worker = threading.Thread(target=self.work)
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+        return future
+    
+    def work(self):
+        """Execute scheduled calls until client is closed."""
+        while True:
+            call = self.calls.get()
+            if call is None:
+                return
+            method, args, resolve = call
+            try:
+                value = method(*args)
+            except Exception as e:
+                resolve(error=e)
+            else:
+                resolve(value)
+    
+    @staticmethod
+    def settle(future, value, error):
+        """Resolve an asyncio.Future within its event loop, unless it has been cancelled meanwhile."""
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+    
+    def status(self, alias):
+        """Retrieve meta info of channels in a worker thread, see Client.status."""
+        return self.call(self.client.status, alias)
+    
+    def start(self, channel):
+        """Start a new SSH channel in a worker thread, see Client.start."""
+        return self.call(self.client.start, channel)
+    
+    def run(self, alias, cmd, timeout=None, tag=None):
+        """Execute a command in a worker thread, see Client.run."""
+        return self.call(self.client.run, alias, cmd, timeout, tag)
+    
+    def abort(self, alias, tag):
+        """Abort an in-flight command in a worker thread, see Client.abort."""
+        return self.call(self.client.abort, alias, tag)
+    
+    def batch(self, alias, cmds, stop_on_failure=False):
+        """Execute a list of commands in a worker thread, see Client.batch."""
+        return self.call(self.client.batch, alias, cmds, stop_on_failure)
+    
+    def submit(self, alias, cmd, timeout=None):
+        """Queue a command as a job in a worker thread, see Client.submit."""
+        return self.call(self.client.submit, alias, cmd, timeout)
+    
+    def job(self, job_id, wait=None, alias=None):
+        """Retrieve a job in a worker thread, see Client.job."""
+        return self.call(self.client.job, job_id, wait, alias)
+    
+    def stop(self, alias):
+        """Terminate a SSH channel in a worker thread, see Client.stop."""
+        return self.call(self.client.stop, alias)
+    
+    def close(self):
+        """Shutdown thread pool and close all HTTP connections kept alive with SSHPool server."""
+        with self.lock:
+            for worker in self.workers:
+                self.calls.put(None)
+            self.workers = list()
+        self.client.close()
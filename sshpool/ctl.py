@@ -12,6 +12,12 @@ import sys
 import cmd
 import time
 import logging
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 from .client import Client
 
@@ -24,11 +30,16 @@ class Ctl(cmd.Cmd):
     prompt = 'sshpool> '
     intro = '==> Press Ctrl-C to exit <=='
     
-    def __init__(self, host, port):
+    # Exit code of script commands which could not be run at all, e.g. unknown alias or unreachable daemon.
+    failed = 255
+    
+    def __init__(self, host, port, shards=None):
         cmd.Cmd.__init__(self)
         self.host = host
         self.port = port
-        self.client = Client(self.host, self.port)
+        self.client = Client(self.host, self.port, shards=shards)
+        self.stderr = sys.stderr
+        self.lock = threading.Lock()
     
     def out(self, line):
         if line is not None:
@@ -36,6 +47,89 @@ class Ctl(cmd.Cmd):
                 line = line.encode('utf-8')
             self.stdout.write('%s\n' % line)
     
+    def write(self, stream, alias, line):
+        """Write a line of output prefixed by alias, without interleaving with lines written by other threads."""
+        line = u'%s\t%s\n' % (alias, line)
+        with self.lock:
+            stream.write(line if sys.version_info[0] >= 3 else line.encode('utf-8'))
+            stream.flush()
+    
+    def script(self, f, parallel=8):
+        """Run commands of a script concurrently, streaming their output line by line as it arrives.
+        
+        Args:
+            f (file): Script with one alias followed by command per line, blank lines and lines starting with # are skipped.
+        
+        Kwargs:
+            parallel (int): Maximum number of commands running at a time.
+        
+        Returns:
+            int. Highest exit code of all commands, 0 if all of them succeeded.
+        
+        """
+        lines = queue.Queue(parallel)
+        codes = list()
+        
+        def work():
+            while True:
+                line = lines.get()
+                if line is None:
+                    return
+                alias, command = (line.split(None, 1) + [''])[:2]
+                try:
+                    codes.append(self.execute(alias, command))
+                except Exception as e:
+                    self.write(self.stderr, alias, '%r' % e)
+                    codes.append(Ctl.failed)
+        
+        workers = [threading.Thread(target=work) for i in range(parallel)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                lines.put(line)
+        for worker in workers:
+            lines.put(None)
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(1)
+        return max(codes) if codes else 0
+    
+    def execute(self, alias, command):
+        """Stream output of a script command prefixed by its alias, stdout to stdout and stderr to stderr.
+        
+        Returns:
+            int. Exit code of command.
+        
+        """
+        if not command:
+            self.write(self.stderr, alias, 'missing command')
+            return Ctl.failed
+        
+        partial = {'stdout': '', 'stderr': ''}
+        streams = {'stdout': self.stdout, 'stderr': self.stderr}
+        last = {'exception': 'no response'}
+        for resp in self.client.stream(alias, command):
+            for key in ('stdout', 'stderr'):
+                if key in resp:
+                    lines = (partial[key] + resp[key]).split('\n')
+                    partial[key] = lines.pop()
+                    for line in lines:
+                        self.write(streams[key], alias, line)
+            last = resp
+        
+        for key in ('stdout', 'stderr'):
+            if partial[key]:
+                self.write(streams[key], alias, partial[key])
+        if 'exit_code' not in last:
+            self.write(self.stderr, alias, last.get('exception', 'no response'))
+            return Ctl.failed
+        if last['exit_code'] != 0:
+            self.write(self.stderr, alias, 'exit code %d' % last['exit_code'])
+        return last['exit_code'] if 0 <= last['exit_code'] <= Ctl.failed else Ctl.failed
+    
     def do_status(self, alias):
         r = self.client.status(alias)
         
@@ -90,6 +184,39 @@ class Ctl(cmd.Cmd):
     def help_run(self):
         self.out('run <alias> <cmd>\tRun arbitrary commands over a channel')
     
+    def do_runall(self, arg):
+        args = arg.split()
+        select = args[0]
+        cmd = ' '.join(args[1:])
+        
+        for resp in self.client.fanout(cmd, select=select):
+            alias = resp.get('alias', select)
+            if 'exception' in resp:
+                self.out('%s\t%s' % (alias, resp['exception']))
+                continue
+            
+            output = resp['stdout'] if resp['exit_code'] == 0 else resp['stderr']
+            for line in output.splitlines():
+                self.out('%s\t%s' % (alias, line))
+    
+    def help_runall(self):
+        self.out('runall <pattern> <cmd>\tRun arbitrary commands in parallel over all channels matching glob pattern')
+    
+    def do_reload(self, arg):
+        if self.client.shard_map is None:
+            self.out('not sharded')
+            return
+        
+        try:
+            changed = self.client.reload()
+        except (IOError, AssertionError) as e:
+            self.out(e)
+            return
+        self.out('%d shards%s' % (len(self.client.shards()), '' if changed else ', unchanged'))
+    
+    def help_reload(self):
+        self.out('reload\t\tReload shard map file')
+    
     def do_stop(self, alias):
         r = self.client.stop(alias)
         
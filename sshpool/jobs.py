@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.jobs
+    ~~~~~~~~~~~~
+
+    This module provides asynchronous execution of commands as jobs,
+    queued per alias with bounded queues and results kept within a memory budget.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import math
+import time
+import uuid
+import logging
+import threading
+import collections
+
+from .channel import Channel, Unavailable
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.jobs')
+
+class QueueFull(Exception):
+    
+    """Raised when job queue of an alias is full."""
+    
+    def __init__(self, alias, retry_after):
+        super(QueueFull, self).__init__('job queue of %s is full, retry in %d seconds' % (alias, retry_after))
+        self.retry_after = retry_after
+
+class Job(object):
+    
+    """A command queued for execution over a SSH channel, along with its state and result."""
+    
+    def __init__(self, alias, cmd, timeout=None):
+        self.id = uuid.uuid4().hex
+        self.alias = alias
+        self.cmd = cmd
+        self.timeout = timeout
+        self.state = 'queued'
+        self.result = None
+        self.size = 0
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0
+        self.changed = threading.Condition()
+    
+    def update(self, state, result=None):
+        """Move job to a new state, waking up callers waiting for a change."""
+        with self.changed:
+            self.state = state
+            if state == 'running':
+                self.started = time.time()
+            elif state == 'done':
+                self.finished = time.time()
+                self.result = result
+            self.version += 1
+            self.changed.notify_all()
+    
+    def wait(self, version, timeout):
+        """Wait for job to change beyond version.
+        
+        Args:
+            version (int): Version of job last seen by caller.
+            timeout (float): Maximum seconds to wait for.
+        
+        Returns:
+            int. Current version of job.
+        
+        """
+        until = time.time() + timeout
+        with self.changed:
+            while self.version == version and self.state != 'done' and time.time() < until:
+                self.changed.wait(until - time.time())
+            return self.version
+    
+    def join(self, timeout):
+        """Wait for job to finish.
+        
+        Args:
+            timeout (float): Maximum seconds to wait for.
+        
+        Returns:
+            bool. Whether job has finished.
+        
+        """
+        until = time.time() + timeout
+        version = self.version
+        while self.state != 'done' and time.time() < until:
+            version = self.wait(version, until - time.time())
+        return self.state == 'done'
+    
+    def info(self, result=True):
+        """Meta info of job.
+        
+        Kwargs:
+            result (bool): Whether to include result of a finished job.
+        
+        Returns:
+            dict.
+        
+        """
+        info = {
+            'id': self.id,
+            'alias': self.alias,
+            'cmd': self.cmd,
+            'state': self.state,
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if result and self.state == 'done':
+            info['result'] = self.result
+        return info
+
+class Jobs(object):
+    
+    """Registry of jobs executed in background, a bounded queue per alias.
+    
+    Each alias is served by at most as many worker threads as its channel has sessions.
+    Results of finished jobs are kept until they expire or total bytes of kept results
+    exceed budget, oldest first.
+    
+    """
+    
+    def __init__(self, max_queued=1000, ttl=3600, max_bytes=64 * 1024 * 1024):
+        """Initialize job registry.
+        
+        Kwargs:
+            max_queued (int): Maximum jobs waiting for execution per alias.
+            ttl (float): Seconds for which results of finished jobs are kept.
+            max_bytes (int): Maximum total bytes of kept results.
+        
+        """
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        
+        self.jobs = dict()
+        self.finished = collections.OrderedDict()
+        self.bytes = 0
+        self.queues = dict()
+        self.workers = dict()
+        self.durations = dict()
+        self.lock = threading.Lock()
+    
+    def submit(self, alias, cmd, workers, timeout=None):
+        """Queue cmd for execution over alias.
+        
+        Args:
+            alias (str): Channel alias.
+            cmd (str): Command to execute.
+            workers (int): Maximum number of jobs of alias executed concurrently.
+        
+        Kwargs:
+            timeout (float): Seconds after which job is aborted, defaults to timeout of the channel.
+        
+        Returns:
+            Job. Raises QueueFull if alias already has max_queued jobs waiting.
+        
+        """
+        job = Job(alias, cmd, timeout)
+        with self.lock:
+            self.expire()
+            jobs = self.queues.setdefault(alias, queue.Queue(self.max_queued))
+            try:
+                jobs.put_nowait(job)
+            except queue.Full:
+                raise QueueFull(alias, self.retry_after(alias))
+            self.jobs[job.id] = job
+            if self.workers.get(alias, 0) < workers:
+                self.workers[alias] = self.workers.get(alias, 0) + 1
+                worker = threading.Thread(target=self.work, args=(alias, ))
+                worker.daemon = True
+                worker.start()
+        return job
+    
+    def retry_after(self, alias):
+        """Estimate seconds after which queue of alias has room, based on its backlog and average job duration. Must be called with lock held.
+        
+        Backlog is made of queued jobs and jobs being run, one per worker, shared among workers of alias.
+        
+        """
+        duration = self.durations.get(alias, 1.0)
+        workers = self.workers.get(alias, 0)
+        backlog = self.queues[alias].qsize() + workers
+        return max(1, int(math.ceil(math.ceil(float(backlog) / max(1, workers)) * duration)))
+    
+    def work(self, alias):
+        """Execute queued jobs of alias until its queue is empty."""
+        while True:
+            with self.lock:
+                try:
+                    job = self.queues[alias].get_nowait()
+                except queue.Empty:
+                    self.workers[alias] -= 1
+                    return
+            if job.state != 'queued':
+                continue
+            
+            job.update('running')
+            try:
+                chan = Channel.get(alias)
+                try:
+                    result = chan.execute(job.cmd, timeout=job.timeout, tag=job.id)
+                finally:
+                    chan.release()
+            except KeyError:
+                result = {'exception': 'channel %s not found' % alias}
+            except Unavailable as e:
+                result = {'exception': str(e)}
+            except Exception as e:
+                logger.exception(e)
+                result = {'exception': '%r' % e}
+            self.finish(job, result)
+    
+    def finish(self, job, result):
+        """Keep result of a finished job, forgetting oldest finished jobs beyond budget."""
+        size = len(result.get('stdout') or '') + len(result.get('stderr') or '')
+        if size > self.max_bytes:
+            result = dict(result, stdout=None, stderr=None, dropped=size)
+            size = 0
+        job.size = size
+        job.update('done', result)
+        
+        with self.lock:
+            duration = job.finished - job.started
+            self.durations[job.alias] = 0.8 * self.durations.get(job.alias, duration) + 0.2 * duration
+            if job.id not in self.jobs:
+                return
+            self.finished[job.id] = job
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self.discard(next(iter(self.finished)))
+    
+    def discard(self, job_id):
+        """Forget a job. Must be called with lock held."""
+        job = self.jobs.pop(job_id)
+        if self.finished.pop(job_id, None) is not None:
+            self.bytes -= job.size
+        return job
+    
+    def expire(self):
+        """Forget finished jobs older than ttl. Must be called with lock held."""
+        now = time.time()
+        while self.finished:
+            job = next(iter(self.finished.values()))
+            if now - job.finished < self.ttl:
+                break
+            self.discard(job.id)
+    
+    def get(self, job_id):
+        """Lookup a job.
+        
+        Returns:
+            Job. None if job is not known or has been forgotten.
+        
+        """
+        with self.lock:
+            self.expire()
+            return self.jobs.get(job_id)
+    
+    def cancel(self, job_id):
+        """Forget a job, skipping its execution if it is still queued or aborting it if running.
+        
+        Returns:
+            Job. None if job is not known.
+        
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            self.discard(job_id)
+        if job.state == 'queued':
+            job.update('done', {'exception': 'job cancelled'})
+        elif job.state == 'running':
+            chan = Channel.channels.get(job.alias)
+            if chan is not None:
+                chan.cancel(job.id)
+        return job
+    
+    def snapshot(self):
+        """Copy of all known jobs, safe to iterate upon."""
+        with self.lock:
+            self.expire()
+            return list(self.jobs.values())
+    
+    def info(self, alias):
+        """Queued and running job counters of alias.
+        
+        Returns:
+            dict.
+        
+        """
+        with self.lock:
+            jobs = self.queues.get(alias)
+            return {
+                'queued': jobs.qsize() if jobs is not None else 0,
+                'workers': self.workers.get(alias, 0),
+            }
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.journal
+    ~~~~~~~~~~~~~~~
+
+    This module provides an on-disk journal of global channel registry,
+    allowing a restarted daemon to bring back channels registered at runtime.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import collections
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.journal')
+
+class Journal(object):
+    
+    """Append-only log of channels added to and removed from global channel registry, along with their last use.
+    
+    Every change is a JSON dict on a line of its own, appended as it happens. Once log grows well beyond
+    number of registered channels, it is compacted into a single add record per channel.
+    DSNs may carry passwords, hence journal is only readable by its owner.
+    
+    """
+    
+    def __init__(self, path, resolution=60):
+        """Initialize journal kept at path.
+        
+        Args:
+            path (str): Journal file path.
+        
+        Kwargs:
+            resolution (float): Seconds by which last use of a channel must advance before it is recorded again.
+        
+        """
+        self.path = path
+        self.resolution = resolution
+        self.entries = collections.OrderedDict()
+        self.records = 0
+        self.file = None
+        self.lock = threading.Lock()
+    
+    def load(self):
+        """Replay journal in one pass.
+        
+        Lines which can not be parsed, e.g. one left partially written by a crash, are skipped.
+        
+        Returns:
+            list. Dicts of alias, dsn and last_used of registered channels, most recently used first.
+        
+        """
+        with self.lock:
+            self.entries.clear()
+            self.records = 0
+            try:
+                f = open(self.path, 'rb')
+            except IOError:
+                return list()
+            
+            with f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logger.warning('skipping corrupt journal record %r' % line)
+                        continue
+                    self.records += 1
+                    self.replay(record)
+            return sorted(self.entries.values(), key=lambda entry: entry['last_used'], reverse=True)
+    
+    def replay(self, record):
+        """Apply a record to entries. Must be called with lock held."""
+        op, alias = record.get('op'), record.get('alias')
+        if op == 'add':
+            self.entries[alias] = {'alias': alias, 'dsn': record['dsn'], 'last_used': record.get('last_used', 0)}
+        elif op == 'del':
+            self.entries.pop(alias, None)
+        elif op == 'use' and alias in self.entries:
+            self.entries[alias]['last_used'] = record['last_used']
+    
+    def append(self, record):
+        """Record a change, compacting journal once it has grown beyond twice the number of entries."""
+        with self.lock:
+            self.replay(record)
+            if self.file is None:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+                self.file = os.fdopen(fd, 'ab')
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            self.records += 1
+            if self.records > max(1024, 2 * len(self.entries)):
+                self.rewrite()
+    
+    def add(self, alias, dsn, last_used=None):
+        """Record a channel added to registry.
+        
+        A channel replacing one of the same alias, e.g. on reconnection, keeps its last recorded use
+        and is not recorded at all when its DSN is unchanged.
+        
+        """
+        entry = self.entries.get(alias)
+        if entry is not None and entry['dsn'] == dsn:
+            return
+        last_used = last_used or (entry['last_used'] if entry is not None else time.time())
+        self.append({'op': 'add', 'alias': alias, 'dsn': dsn, 'last_used': last_used})
+    
+    def remove(self, alias):
+        """Record a channel removed from registry."""
+        self.append({'op': 'del', 'alias': alias})
+    
+    def sync(self, channels):
+        """Record last use of channels which have been used since their last recorded use.
+        
+        Args:
+            channels (dict): Registered channels keyed by alias, e.g. Channel.snapshot().
+        
+        """
+        for alias, chan in channels.items():
+            entry = self.entries.get(alias)
+            if entry is not None and chan.last_used - entry['last_used'] >= self.resolution:
+                self.append({'op': 'use', 'alias': alias, 'last_used': chan.last_used})
+    
+    def compact(self, channels):
+        """Replace journal with a single add record per registered channel.
+        
+        Args:
+            channels (dict): Registered channels keyed by alias, e.g. Channel.snapshot().
+        
+        """
+        with self.lock:
+            self.entries.clear()
+            for alias, chan in channels.items():
+                self.entries[alias] = {'alias': alias, 'dsn': chan.dsn, 'last_used': chan.last_used}
+            self.rewrite()
+    
+    def rewrite(self):
+        """Atomically replace journal with records of current entries. Must be called with lock held."""
+        tmp = '%s.tmp' % self.path
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(dict(entry, op='add')) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.path)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.records = len(self.entries)
+    
+    def close(self):
+        """Close journal file."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.metrics
+    ~~~~~~~~~~~~~~~
+
+    This module provides counters and histograms of SSH channel
+    activity, exposed in Prometheus text exposition format.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import threading
+
+class Histogram(object):
+    
+    """Cumulative histogram of observed values."""
+    
+    def __init__(self, buckets):
+        """Initialize an empty histogram.
+        
+        Args:
+            buckets (tuple): Sorted upper bounds of buckets, an implicit +Inf bucket follows.
+        
+        """
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        """Account an observed value."""
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics(object):
+    
+    """Thread-safe registry of counters and histograms labelled by channel alias."""
+    
+    # Name, type and description of exposed metrics, in exposition order.
+    metrics = (
+        ('sshpool_commands_total', 'counter', 'Commands executed over channel'),
+        ('sshpool_commands_failed_total', 'counter', 'Commands which raised an exception or exited with non-zero exit code'),
+        ('sshpool_command_duration_seconds', 'histogram', 'Seconds from command submission until its final response'),
+        ('sshpool_pipe_wait_seconds', 'histogram', 'Seconds spent waiting to write a command to channel process pipe'),
+        ('sshpool_stdout_bytes_total', 'counter', 'Bytes of stdout received'),
+        ('sshpool_stderr_bytes_total', 'counter', 'Bytes of stderr received'),
+        ('sshpool_reconnects_total', 'counter', 'Restarts of dead channels'),
+        ('sshpool_http_request_duration_seconds', 'histogram', 'Seconds spent serving REST API requests'),
+        ('sshpool_in_flight_requests', 'gauge', 'Commands submitted to channel and yet to be fully replied'),
+        ('sshpool_queued_requests', 'gauge', 'Commands waiting for a free session of channel'),
+    )
+    
+    # Upper bounds of histogram buckets, in seconds.
+    buckets = {
+        'sshpool_command_duration_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+        'sshpool_pipe_wait_seconds': (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+        'sshpool_http_request_duration_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    }
+    
+    def __init__(self):
+        self.counters = dict()
+        self.histograms = dict()
+        self.lock = threading.Lock()
+    
+    def inc(self, name, alias, value=1):
+        """Increment counter name of alias by value."""
+        with self.lock:
+            key = (name, alias)
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def observe(self, name, alias, value):
+        """Account value in histogram name of alias."""
+        with self.lock:
+            key = (name, alias)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets[name])
+            self.histograms[key].observe(value)
+    
+    def output(self, alias, resp):
+        """Account bytes of stdout and stderr carried by a response, including results of a batch."""
+        for result in resp.get('results') or [resp]:
+            for stream in ('stdout', 'stderr'):
+                if result.get(stream):
+                    self.inc('sshpool_%s_bytes_total' % stream, alias, len(result[stream]))
+                elif stream in result.get('spill', dict()):
+                    self.inc('sshpool_%s_bytes_total' % stream, alias, result['spill'][stream]['size'])
+    
+    def command(self, alias, duration, resp):
+        """Account a completed command.
+        
+        Args:
+            alias (str): Channel alias command was executed over.
+            duration (float): Seconds from submission until final response.
+            resp (dict): Final response of command.
+        
+        """
+        self.inc('sshpool_commands_total', alias)
+        if 'exception' in resp or resp.get('exit_code'):
+            self.inc('sshpool_commands_failed_total', alias)
+        self.observe('sshpool_command_duration_seconds', alias, duration)
+        self.output(alias, resp)
+    
+    def reset(self):
+        """Forget all accounted values."""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+    
+    @staticmethod
+    def labels(alias, **extra):
+        """Format label set of a sample."""
+        pairs = [('alias', alias)] + sorted(extra.items())
+        return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in pairs)
+    
+    @staticmethod
+    def number(value):
+        """Format a sample value."""
+        return repr(float(value)) if isinstance(value, float) else str(value)
+    
+    def render(self, gauges=None):
+        """Render all metrics in Prometheus text exposition format.
+        
+        Kwargs:
+            gauges (dict): Current values of gauges, mapping gauge name to a dict of alias and value.
+        
+        Returns:
+            str.
+        
+        """
+        gauges = gauges or dict()
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = dict((key, (list(h.counts), h.sum, h.count)) for key, h in self.histograms.items())
+        
+        lines = list()
+        for name, kind, description in self.metrics:
+            lines.append('# HELP %s %s' % (name, description))
+            lines.append('# TYPE %s %s' % (name, kind))
+            if kind == 'counter':
+                for (metric, alias), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append('%s%s %s' % (name, self.labels(alias), self.number(value)))
+            elif kind == 'gauge':
+                for alias, value in sorted(gauges.get(name, dict()).items()):
+                    lines.append('%s%s %s' % (name, self.labels(alias), self.number(value)))
+            else:
+                for (metric, alias), (counts, total, count) in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, value in zip(self.buckets[name], counts):
+                        lines.append('%s_bucket%s %d' % (name, self.labels(alias, le=self.number(float(bound))), value))
+                    lines.append('%s_bucket%s %d' % (name, self.labels(alias, le='+Inf'), count))
+                    lines.append('%s_sum%s %s' % (name, self.labels(alias), self.number(total)))
+                    lines.append('%s_count%s %d' % (name, self.labels(alias), count))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.monitor
+    ~~~~~~~~~~~~~~~
+
+    This module provides a background thread periodically
+    looking after channels in global channel registry.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import time
+import logging
+import threading
+
+from .channel import Channel
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.monitor')
+
+class Monitor(threading.Thread):
+    
+    """Daemon thread maintaining channels of global channel registry in background.
+    
+    Disconnects idle channels, probes health of running channels, reconnects dead channels
+    and journals their last use.
+    
+    """
+    
+    def __init__(self, interval=1, probe_interval=30, probe_timeout=10):
+        """Initialize a new monitor.
+        
+        Kwargs:
+            interval (float): Seconds between two consecutive runs.
+            probe_interval (float): Seconds between two consecutive health probes of running channels, 0 to disable.
+            probe_timeout (float): Seconds after which a channel not responding to a probe is considered down.
+        
+        """
+        super(Monitor, self).__init__()
+        self.daemon = True
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.last_probe = time.time()
+        self.stopped = threading.Event()
+    
+    def run_once(self):
+        """Disconnect idle channels, reconnect dead channels and probe running channels when due.
+        
+        Channels are disconnected once idle for too long, reconnected once their backoff has elapsed.
+        
+        """
+        evicted = Channel.evict_idle()
+        if evicted:
+            logger.info('disconnected %d idle channels' % evicted)
+        
+        reconnected = Channel.reconnect_dead()
+        if reconnected:
+            logger.info('reconnecting %d dead channels' % reconnected)
+        
+        if self.probe_interval and time.time() - self.last_probe >= self.probe_interval:
+            self.last_probe = time.time()
+            failed = Channel.check_health(self.probe_timeout)
+            if failed:
+                logger.warning('%d channels failed health probe' % failed)
+        
+        if Channel.journal is not None:
+            Channel.journal.sync(Channel.snapshot())
+    
+    def run(self):
+        """Maintain channels every interval seconds until stopped."""
+        while not self.stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception(e)
+    
+    def stop(self):
+        """Stop monitor after its ongoing run."""
+        self.stopped.set()
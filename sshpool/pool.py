@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.pool
+    ~~~~~~~~~~~~
+
+    This module provides capability to back a single alias
+    with several SSH channels, growing and shrinking on demand
+    and dispatching commands to the least busy one.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import time
+import logging
+import threading
+
+from .channel import Channel
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.pool')
+
+class Pool(object):
+    
+    """Pool of SSH channels connected with same DSN.
+    
+    Pool exposes same API as Channel, hence it can be placed in global channel registry.
+    
+    Attributes:
+        template (Channel): Unstarted channel describing DSN of pool members.
+    
+    """
+    
+    # Seconds after which an unused member beyond pool_min is terminated.
+    pool_idle = 300
+    
+    def __init__(self, template):
+        """Initialize a new pool of SSH channels.
+        
+        Args:
+            template (Channel): Unstarted channel, DSN options pool_min, pool_max
+                and pool_idle configure size of the pool.
+        
+        """
+        self.template = template
+        self.alias = template.alias
+        self.dsn = template.dsn
+        self.sessions = template.sessions
+        self.lazy = template.lazy
+        self.idle = template.idle
+        
+        self.pool_min = int(template.options.get('pool_min', 1))
+        self.pool_max = int(template.options.get('pool_max', self.pool_min))
+        self.pool_idle = float(template.options.get('pool_idle', Pool.pool_idle))
+        assert 0 < self.pool_min <= self.pool_max
+        
+        self.members = list()
+        self.reserved = 0
+        self.lock = threading.Lock()
+        self.started = False
+        self.starting = False
+        
+        self.start_time = time.time()
+        self.last_used = time.time()
+        self.health = 'unknown'
+        self.failures = 0
+        self.retry_at = None
+    
+    @property
+    def pending(self):
+        """Number of commands submitted to pool members and yet to be fully replied."""
+        return sum(chan.pending for chan in list(self.members))
+    
+    def reserve(self):
+        """Reserve pool like Channel.reserve, until release is called."""
+        with self.lock:
+            self.reserved += 1
+    
+    def release(self):
+        """Give up a reservation, see Channel.release."""
+        with self.lock:
+            self.reserved = max(0, self.reserved - 1)
+    
+    def in_use(self):
+        """Tell whether pool has pending commands or is reserved, see Channel.in_use."""
+        return self.pending > 0 or self.reserved > 0
+    
+    def spawn(self):
+        """Start a new pool member. Must be called with lock held.
+        
+        Returns:
+            Channel.
+        
+        """
+        chan = Channel(self.template.dsn)
+        chan.start()
+        self.members.append(chan)
+        logger.info('pool %s grown to %d channels' % (self.alias, len(self.members)))
+        return chan
+    
+    def shrink(self):
+        """Terminate dead members and members idle for more than pool_idle seconds.
+        
+        At least pool_min members are kept around. Must be called with lock held.
+        
+        """
+        now = time.time()
+        for chan in list(self.members):
+            if not chan.is_alive():
+                self.members.remove(chan)
+            elif len(self.members) > self.pool_min and chan.pending == 0 and now - chan.last_used > self.pool_idle:
+                chan.terminate()
+                self.members.remove(chan)
+                logger.info('pool %s shrunk to %d channels' % (self.alias, len(self.members)))
+    
+    def select(self):
+        """Pick least busy member, growing the pool if all members are saturated.
+        
+        Must be called with lock held.
+        
+        Returns:
+            Channel.
+        
+        """
+        self.shrink()
+        chan = min(self.members, key=lambda member: member.pending) if self.members else None
+        if chan is None or (chan.pending >= chan.sessions and len(self.members) < self.pool_max):
+            chan = self.spawn()
+        return chan
+    
+    def start(self):
+        """Start pool_min members."""
+        with self.lock:
+            self.started = True
+            while len(self.members) < self.pool_min:
+                self.spawn()
+    
+    def route(self, cmd, **options):
+        """Submit a command to least busy SSH channel of the pool.
+        
+        Args:
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            Same as Channel.send.
+        
+        Returns:
+            tuple. Channel command was submitted to and request id to wait upon.
+        
+        """
+        with self.lock:
+            self.last_used = time.time()
+            chan = self.select()
+            req_id = chan.submit(cmd, **options)
+            return chan, req_id
+    
+    def execute(self, cmd, spill=False, timeout=None, tag=None):
+        """Execute a command over least busy SSH channel of the pool and wait for its output.
+        
+        Args:
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            spill, timeout, tag: Same as Channel.execute.
+        
+        Returns:
+            dict. A dictionary containing stdout, stderr and exit code of executed command.
+        
+        """
+        options = {'spill': True} if spill else dict()
+        chan, req_id = self.route(cmd, tag=tag, timeout=timeout, **options)
+        resp = chan.wait(req_id)
+        return resp if spill else Channel.load(resp)
+    
+    def batch(self, cmds, stop_on_failure=False, timeout=None, tag=None):
+        """Execute a list of commands one after another over least busy SSH channel of the pool.
+        
+        Args:
+            cmds (list): Commands to execute.
+        
+        Kwargs:
+            stop_on_failure (bool): Skip remaining commands once a command exits with non-zero exit code.
+            timeout, tag: Same as Channel.batch.
+        
+        Returns:
+            dict. Same as Channel.batch.
+        
+        """
+        chan, req_id = self.route(cmds, tag=tag, batch=True, stop_on_failure=stop_on_failure, timeout=timeout)
+        return Channel.load(chan.wait(req_id))
+    
+    def stream(self, cmd, timeout=None, tag=None):
+        """Execute a command over least busy SSH channel of the pool and iterate over its output as it arrives.
+        
+        Args:
+            cmd (str): Command to execute.
+        
+        Kwargs:
+            timeout, tag: Same as Channel.stream.
+        
+        Yields:
+            dict. Same as Channel.stream.
+        
+        """
+        chan, req_id = self.route(cmd, tag=tag, stream=True, timeout=timeout)
+        frames = chan.replies(req_id)
+        try:
+            for resp in frames:
+                yield resp
+        finally:
+            frames.close()
+    
+    def cancel(self, tag):
+        """Cancel a command like Channel.cancel, over whichever member the command was routed to."""
+        return any(chan.cancel(tag) for chan in list(self.members))
+    
+    def stat(self, path):
+        """Stat a remote file like Channel.stat, over least busy SSH channel of the pool."""
+        chan, req_id = self.route(path, stat=True)
+        return chan.wait(req_id)
+    
+    def download(self, path, offset=0, length=None):
+        """Download a remote file like Channel.download, over least busy SSH channel of the pool."""
+        chan, req_id = self.route(path, download=True, offset=offset, length=length)
+        frames = chan.replies(req_id)
+        try:
+            for resp in frames:
+                yield resp
+        finally:
+            frames.close()
+    
+    def upload(self, path, chunks, offset=0):
+        """Upload a remote file like Channel.upload, over least busy SSH channel of the pool."""
+        chan, req_id = self.route(path, upload=True, offset=offset)
+        return chan.feed(req_id, chunks)
+    
+    def is_alive(self):
+        """Whether pool has been started and at least one of its members is alive."""
+        return self.started and any(chan.is_alive() for chan in list(self.members))
+    
+    def queued(self):
+        """Count pending commands waiting for a free session within pool members."""
+        return sum(chan.queued() for chan in list(self.members))
+    
+    def wait_connected(self, timeout):
+        """Wait for members to connect.
+        
+        Args:
+            timeout (float): Maximum seconds to wait for.
+        
+        Returns:
+            bool. Whether at least one member is connected.
+        
+        """
+        until = time.time() + timeout
+        connected = [chan.wait_connected(until - time.time()) for chan in list(self.members)]
+        return any(connected)
+    
+    def connections(self):
+        """SSH channels backing this alias."""
+        return list(self.members)
+    
+    def state(self):
+        """State of pool, one of cold (yet to be started), connecting, running or dead.
+        
+        Pool is running as soon as one of its members is connected.
+        
+        """
+        if not self.started:
+            return 'connecting' if self.starting else 'cold'
+        states = [chan.state() for chan in list(self.members)]
+        if 'running' in states:
+            return 'running'
+        return 'connecting' if 'connecting' in states else 'dead'
+    
+    def join(self):
+        """Wait for all members to terminate."""
+        for chan in list(self.members):
+            chan.join()
+    
+    def terminate(self):
+        """Terminate all members."""
+        with self.lock:
+            for chan in self.members:
+                chan.terminate()
+            del self.members[:]
+    
+    def info(self):
+        """Grab meta info about pool of SSH channels.
+        
+        Returns:
+            dict.
+        
+        """
+        info = self.template.info()
+        members = list(self.members)
+        info.update({
+            'state': self.state(),
+            'is_alive': self.is_alive(),
+            'start_time': self.start_time,
+            'last_used': self.last_used,
+            'health': 'up' if any(chan.health == 'up' for chan in members) else self.health,
+            'failures': self.failures,
+            'retry_at': self.retry_at,
+            'pool_min': self.pool_min,
+            'pool_max': self.pool_max,
+            'pool_size': len(members),
+            'pending': sum(chan.pending for chan in members),
+        })
+        return info
+    
+    def stop(self):
+        """Terminate all SSH channels of the pool and update global channel registry."""
+        self.terminate()
+        Channel.unregister(self)
+    
+    def __str__(self):
+        """Render DSN of pool members."""
+        return str(self.template)
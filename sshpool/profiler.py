@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.profiler
+    ~~~~~~~~~~~~~~~~
+
+    This module provides a sampling profiler which can be started and
+    stopped at runtime, aggregating stacks of all threads of a process.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import sys
+import time
+import logging
+import threading
+import collections
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.profiler')
+
+class Profiler(object):
+    
+    """Statistical profiler taking a snapshot of stacks of all threads at a fixed interval.
+    
+    Samples are aggregated as collapsed stacks, one line per distinct stack with frames from outermost to innermost
+    separated by ; followed by number of samples, the input format of flame graph tools. Overhead is confined to
+    the sampling thread and grows with number of threads and interval, hence it is only running when asked to.
+    
+    """
+    
+    def __init__(self):
+        self.samples = collections.Counter()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopped = threading.Event()
+        self.interval = None
+        self.started = None
+    
+    @property
+    def running(self):
+        """Whether profiler is sampling."""
+        return self.thread is not None
+    
+    def start(self, interval=0.01):
+        """Start sampling, discarding samples of an earlier run.
+        
+        Kwargs:
+            interval (float): Seconds between samples.
+        
+        Returns:
+            bool. Whether profiler has been started, False if it is already running.
+        
+        """
+        with self.lock:
+            if self.thread is not None:
+                return False
+            self.samples.clear()
+            self.interval = interval
+            self.started = time.time()
+            self.stopped.clear()
+            self.thread = threading.Thread(target=self.run, name='sshpool-profiler')
+            self.thread.daemon = True
+            self.thread.start()
+        logger.info('profiler started, sampling every %s seconds' % interval)
+        return True
+    
+    def stop(self):
+        """Stop sampling, keeping samples taken so far.
+        
+        Returns:
+            bool. Whether profiler has been stopped, False if it is not running.
+        
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is None:
+            return False
+        self.stopped.set()
+        thread.join()
+        logger.info('profiler stopped after %d samples' % sum(self.samples.values()))
+        return True
+    
+    def run(self):
+        """Take samples until stopped."""
+        while not self.stopped.wait(self.interval):
+            self.sample()
+    
+    @staticmethod
+    def frame(frame):
+        """Label of a stack frame, identifying its function."""
+        code = frame.f_code
+        return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+    
+    def sample(self):
+        """Record current stack of every thread, other than the calling one."""
+        me = threading.current_thread().ident
+        stacks = list()
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = list()
+            while frame is not None:
+                stack.append(Profiler.frame(frame))
+                frame = frame.f_back
+            stacks.append(';'.join(reversed(stack)))
+        with self.lock:
+            self.samples.update(stacks)
+    
+    def info(self):
+        """State of profiler along with number of samples taken."""
+        return {
+            'running': self.running,
+            'interval': self.interval,
+            'started': self.started,
+            'samples': sum(self.samples.values()),
+        }
+    
+    def render(self):
+        """Collapsed stacks, most sampled first.
+        
+        Returns:
+            str.
+        
+        """
+        with self.lock:
+            samples = self.samples.most_common()
+        return ''.join('%s %d\n' % (stack, count) for stack, count in samples)
@@ -8,36 +8,117 @@
     :copyright: (c) 2013 by Abhinav Singh.
     :license: BSD, see LICENSE for more details.
 """
+import json
+import math
+import errno
+import time
+import fnmatch
+import numbers
 import logging
-from flask import Flask, Response, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask.views import MethodView
 
-from .channel import Channel
+from .cache import Cache
+from .channel import Channel, Unavailable
+from .jobs import Jobs, QueueFull
+from .profiler import Profiler
+from .server import Server, serve
 
 logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
 logger = logging.getLogger('sshpool.rest')
 
+def unavailable(e):
+    """Response asking client to retry once a channel which is down is due to reconnect."""
+    r = Response('SERVICE UNAVAILABLE', 503)
+    r.headers['Retry-After'] = str(int(math.ceil(e.retry_after)))
+    return r
+
 class API(MethodView):
     
     """REST API view."""
     
+    # Outputs of idempotent commands, consulted when asked for by a request or command is allow listed.
+    # Shared with Channel.cache, so that outputs of an alias are invalidated once it is registered anew.
+    cache = Channel.cache = Cache()
+    
+    # Bytes per chunk while serving a spilled output.
+    chunk_size = 1024 * 1024
+    
+    # Phases of a command in the order it goes through them, see Channel.work.
+    phases = ('parse', 'pipe', 'queue', 'session', 'exec', 'read', 'spill', 'reply', 'load', 'total')
+    
+    @staticmethod
+    def timed(resp, started, parsed):
+        """Add phases spent by this request outside of channel to timings of executed command.
+        
+        These are parse (receiving and parsing request) and total (since request was received).
+        
+        Returns:
+            dict. resp itself.
+        
+        """
+        timings = resp.setdefault('timings', dict())
+        timings['parse'] = parsed - started
+        timings['total'] = time.time() - started
+        return resp
+    
+    @staticmethod
+    def server_timing(r, timings):
+        """Expose timings in Server-Timing header of response r, in milliseconds."""
+        r.headers['Server-Timing'] = ', '.join('%s;dur=%.3f' % (phase, timings[phase] * 1000) for phase in API.phases if phase in timings)
+        return r
+    
+    @staticmethod
+    def raw(resp, stream):
+        """Serve stdout or stderr of executed command as is, straight off its spill file if spilled.
+        
+        Exit code is sent in X-Exit-Code header. Responds with 502 and JSON dict if command raised an exception.
+        
+        """
+        if 'exception' in resp:
+            Channel.discard(resp)
+            return Response(json.dumps(resp), 502, mimetype='application/json')
+        
+        desc = resp.get('spill', dict()).pop(stream, None)
+        Channel.discard(resp)
+        if desc is None:
+            body, size = resp[stream] or '', len(resp[stream] or '')
+        else:
+            body, size = Channel.chunks(desc, API.chunk_size), desc['size']
+        r = Response(body, mimetype='application/octet-stream')
+        r.headers['Content-Length'] = str(size)
+        r.headers['X-Exit-Code'] = str(resp['exit_code'])
+        return r
+    
+    @staticmethod
+    def info(alias, chan):
+        """Meta info of SSH channel along with its cache counters."""
+        info = chan.info()
+        info['cache'] = API.cache.info(alias)
+        info['jobs'] = JobsAPI.jobs.info(alias)
+        return info
+    
     def get(self, alias):
         """Retrieve meta info for one or all SSH channels."""
         if alias:
-            if alias not in Channel.channels:
+            chan = Channel.channels.get(alias)
+            if chan is None:
                 return Response('NOT FOUND', 404)
             
-            chan = Channel.channels[alias]
-            return jsonify(**chan.info())
+            return jsonify(**API.info(alias, chan))
         
         kwargs = dict()
-        for alias in Channel.channels:
-            chan = Channel.channels[alias]
-            kwargs[alias] = chan.info()
+        for alias, chan in Channel.snapshot().items():
+            kwargs[alias] = API.info(alias, chan)
         return jsonify(**kwargs)
     
     def post(self, alias):
-        """Start a new SSH channel or execute command over a SSH channel."""
+        """Start a new SSH channel or execute command over a SSH channel.
+        
+        Responses of commands carry per-phase timings, see timed, also sent in Server-Timing header
+        unless output is streamed, in which case only final frame carries them.
+        
+        """
         if not alias:
             channel = request.data
             try:
@@ -47,32 +128,413 @@ class API(MethodView):
                 logger.critical('Unable to start SSH channel due to %r' % e)
                 return Response('BAD REQUEST', 400)
         
-        if alias not in Channel.channels:
+        raw = request.args.get('raw')
+        if raw not in (None, 'stdout', 'stderr'):
+            return Response('BAD REQUEST', 400)
+        
+        timeout = request.args.get('timeout', type=float)
+        tag = request.headers.get('X-Request-Id')
+        started = request.environ.get('sshpool.started') or g.get('started') or time.time()
+        cmd = request.data
+        parsed = time.time()
+        
+        ttl = request.args.get('cache', type=float)
+        cached = not raw and not request.args.get('stream') and (ttl or API.cache.allowed(cmd))
+        if cached and alias in Channel.channels:
+            # a hit is served without reserving, starting or reconnecting the channel
+            resp = API.cache.get(alias, cmd)
+            if resp is not None:
+                # timings of a cached response belong to the request which executed it
+                resp = API.timed(dict(resp, timings=dict()), started, parsed)
+                r = API.server_timing(jsonify(**resp), resp['timings'])
+                r.headers['X-Cache'] = 'HIT'
+                return r
+        
+        try:
+            chan = Channel.get(alias)
+        except KeyError:
             return Response('NOT FOUND', 404)
+        except Unavailable as e:
+            return unavailable(e)
+        
+        if not raw and request.args.get('stream'):
+            def frames():
+                for resp in chan.stream(cmd, timeout=timeout, tag=tag):
+                    if Channel.is_final(resp):
+                        API.timed(resp, started, parsed)
+                    yield '%s\n' % json.dumps(resp)
+            r = Response(frames(), mimetype='application/x-ndjson')
+            r.call_on_close(chan.release)
+            return r
+        
+        try:
+            if raw:
+                resp = API.timed(chan.execute(cmd, spill=True, timeout=timeout, tag=tag), started, parsed)
+                return API.server_timing(API.raw(resp, raw), resp['timings'])
+            
+            if not cached:
+                resp = API.timed(Channel.load(chan.execute(cmd, spill=True, timeout=timeout, tag=tag)), started, parsed)
+                return API.server_timing(jsonify(**resp), resp['timings'])
+            
+            resp = Channel.load(chan.execute(cmd, spill=True, timeout=timeout, tag=tag))
+        finally:
+            chan.release()
         
-        chan = Channel.channels[alias]
-        if not chan.is_alive():
-            logger.info('Channel alias %s is dead, restarting' % alias)
-            chan = Channel.init(str(chan))
-        chan.send(request.data)
-        return jsonify(**chan.recv())
+        API.cache.put(alias, cmd, resp, ttl)
+        resp = API.timed(dict(resp, timings=dict(resp.get('timings') or dict())), started, parsed)
+        r = API.server_timing(jsonify(**resp), resp['timings'])
+        r.headers['X-Cache'] = 'MISS'
+        return r
     
     def delete(self, alias):
         """Stop/terminate a previously configured SSH channel."""
-        if alias not in Channel.channels:
+        chan = Channel.channels.get(alias)
+        if chan is None:
             return Response('NOT FOUND', 404)
         
-        chan = Channel.channels[alias]
         chan.stop()
+        API.cache.invalidate(alias)
+        return 'OK'
+
+class CacheAPI(MethodView):
+    
+    """REST API view to invalidate cached command outputs of a SSH channel."""
+    
+    def delete(self, alias):
+        """Remove all cached command outputs of alias."""
+        API.cache.invalidate(alias)
+        return 'OK'
+
+class Batch(MethodView):
+    
+    """REST API view to execute a list of commands one after another over a SSH channel."""
+    
+    def post(self, alias):
+        """Execute commands over a SSH channel.
+        
+        Expects a JSON dict with keys commands (list), stop_on_failure (bool) and timeout (seconds).
+        
+        """
+        params = request.get_json(force=True, silent=True)
+        if not isinstance(params, dict) or not isinstance(params.get('commands'), list):
+            return Response('BAD REQUEST', 400)
+        
+        try:
+            chan = Channel.get(alias)
+        except KeyError:
+            return Response('NOT FOUND', 404)
+        except Unavailable as e:
+            return unavailable(e)
+        
+        try:
+            return jsonify(**chan.batch(
+                params['commands'], bool(params.get('stop_on_failure')),
+                timeout=params.get('timeout'), tag=request.headers.get('X-Request-Id'),
+            ))
+        finally:
+            chan.release()
+
+class Commands(MethodView):
+    
+    """REST API view to cancel in-flight commands of a SSH channel."""
+    
+    def delete(self, alias, tag):
+        """Abort command submitted with X-Request-Id header tag, closing its SSH session."""
+        chan = Channel.channels.get(alias)
+        if chan is None or not chan.cancel(tag):
+            return Response('NOT FOUND', 404)
+        return 'OK'
+
+class Files(MethodView):
+    
+    """REST API view to transfer files over SFTP sessions of a SSH channel.
+    
+    Remote file path is passed in path query parameter, relative paths are relative to home directory of SSH user.
+    
+    """
+    
+    # HTTP status of failed transfers by errno.
+    statuses = {
+        errno.ENOENT: (404, 'NOT FOUND'),
+        errno.EACCES: (403, 'FORBIDDEN'),
+        errno.EINVAL: (416, 'RANGE NOT SATISFIABLE'),
+    }
+    
+    @staticmethod
+    def error(resp):
+        """Response of a failed transfer."""
+        status, message = Files.statuses.get(resp.get('errno'), (502, 'BAD GATEWAY'))
+        return Response(message, status)
+    
+    def lookup(self, alias):
+        """Remote file path and reserved channel of a request, or an error response."""
+        path = request.args.get('path')
+        if not path:
+            return None, Response('BAD REQUEST', 400)
+        
+        try:
+            return path, Channel.get(alias)
+        except KeyError:
+            return None, Response('NOT FOUND', 404)
+        except Unavailable as e:
+            return None, unavailable(e)
+    
+    def head(self, alias):
+        """Size and modification time of a remote file, useful to resume an upload."""
+        path, chan = self.lookup(alias)
+        if path is None:
+            return chan
+        
+        try:
+            resp = chan.stat(path)
+        finally:
+            chan.release()
+        if 'exception' in resp:
+            return Files.error(resp)
+        
+        r = Response(mimetype='application/octet-stream')
+        r.headers['Content-Length'] = str(resp['size'])
+        r.headers['Accept-Ranges'] = 'bytes'
+        r.last_modified = resp['mtime']
+        return r
+    
+    def get(self, alias):
+        """Download a remote file, streaming chunks as they arrive. A single byte range may be requested."""
+        path, chan = self.lookup(alias)
+        if path is None:
+            return chan
+        
+        offset, length = 0, None
+        ranged = request.range is not None and request.range.units == 'bytes' and len(request.range.ranges) == 1
+        if ranged:
+            start, stop = request.range.ranges[0]
+            offset = start
+            length = stop - start if stop is not None and start >= 0 else None
+        
+        try:
+            frames = chan.download(path, offset, length)
+            head = next(frames)
+        except Exception:
+            chan.release()
+            raise
+        if 'exception' in head:
+            chan.release()
+            return Files.error(head)
+        
+        if ranged and head['offset'] >= head['size']:
+            frames.close()
+            chan.release()
+            r = Response('RANGE NOT SATISFIABLE', 416)
+            r.headers['Content-Range'] = 'bytes */%d' % head['size']
+            return r
+        
+        def body():
+            try:
+                for frame in frames:
+                    if 'data' in frame:
+                        yield frame['data']
+                    elif 'exception' in frame:
+                        logger.error('download of %s over %s failed with %s' % (path, alias, frame['exception']))
+            finally:
+                frames.close()
+        
+        r = Response(body(), 206 if ranged else 200, mimetype='application/octet-stream')
+        r.call_on_close(chan.release)
+        r.headers['Content-Length'] = str(head['length'])
+        r.headers['Accept-Ranges'] = 'bytes'
+        if ranged:
+            r.headers['Content-Range'] = 'bytes %d-%d/%d' % (head['offset'], head['offset'] + head['length'] - 1, head['size'])
+        return r
+    
+    def put(self, alias):
+        """Upload request body into a remote file, chunk by chunk. Pass offset to resume a previous upload."""
+        offset = request.args.get('offset', 0, type=int)
+        path, chan = self.lookup(alias)
+        if path is None:
+            return chan
+        
+        chunks = iter(lambda: request.stream.read(Channel.bufsize), b'')
+        try:
+            resp = chan.upload(path, chunks, offset)
+        finally:
+            chan.release()
+        if 'exception' in resp:
+            return Files.error(resp)
+        return jsonify(**resp)
+
+class FanOut(MethodView):
+    
+    """REST API view to execute a command over many SSH channels in parallel."""
+    
+    # Default number of channels executing command at a time.
+    concurrency = 32
+    
+    @staticmethod
+    def positive(value, kind):
+        """Whether a JSON parameter is a positive number of kind, booleans aside."""
+        return isinstance(value, kind) and not isinstance(value, bool) and value > 0
+    
+    def post(self):
+        """Execute command over channels listed by aliases and/or matching select glob pattern.
+        
+        Expects a JSON dict with keys cmd, aliases, select, concurrency and deadline.
+        Responds with one JSON dict per line, as soon as each channel finishes.
+        
+        """
+        params = request.get_json(force=True, silent=True)
+        if not isinstance(params, dict) or not params.get('cmd'):
+            return Response('BAD REQUEST', 400)
+        
+        concurrency = params.get('concurrency')
+        deadline = params.get('deadline')
+        if not (concurrency is None or FanOut.positive(concurrency, numbers.Integral)) or not (deadline is None or FanOut.positive(deadline, numbers.Real)):
+            return Response('BAD REQUEST', 400)
+        if not isinstance(params.get('aliases') or list(), list):
+            return Response('BAD REQUEST', 400)
+        
+        aliases = list(params.get('aliases') or list())
+        if params.get('select'):
+            aliases += sorted(fnmatch.filter(Channel.snapshot(), params['select']))
+        
+        results = Channel.fanout(aliases, params['cmd'], concurrency=concurrency or FanOut.concurrency, deadline=deadline)
+        frames = ('%s\n' % json.dumps(resp) for resp in results)
+        return Response(frames, mimetype='application/x-ndjson')
+
+class JobsAPI(MethodView):
+    
+    """REST API view to execute commands asynchronously as jobs and fetch their results later."""
+    
+    # Queued, running and finished jobs.
+    jobs = Jobs()
+    
+    # Maximum seconds a request may wait for a job to finish.
+    max_wait = 60
+    
+    def post(self, alias):
+        """Queue a command for execution over a SSH channel.
+        
+        Responds with 202 and job meta info right away, or 429 if job queue of channel is full.
+        Pass timeout=<seconds> to abort job running for longer.
+        
+        """
+        try:
+            chan = Channel.get(alias)
+        except KeyError:
+            return Response('NOT FOUND', 404)
+        except Unavailable as e:
+            return unavailable(e)
+        
+        # job is executed over channel looked up again once its turn comes
+        chan.release()
+        try:
+            job = JobsAPI.jobs.submit(alias, request.data, chan.sessions, request.args.get('timeout', type=float))
+        except QueueFull as e:
+            r = Response('TOO MANY REQUESTS', 429)
+            r.headers['Retry-After'] = str(e.retry_after)
+            return r
+        
+        r = jsonify(**job.info())
+        r.status_code = 202
+        r.headers['Location'] = '/jobs/%s' % job.id
+        return r
+    
+    def get(self, job_id):
+        """Retrieve meta info of one or all jobs.
+        
+        A single job is retrieved along with its result once finished. Pass wait=<seconds>
+        to hold response until job finishes, or stream=1 to receive one JSON dict per line
+        every time job changes state.
+        
+        """
+        if not job_id:
+            return jsonify(**dict((job.id, job.info(result=False)) for job in JobsAPI.jobs.snapshot()))
+        
+        job = JobsAPI.jobs.get(job_id)
+        if job is None:
+            return Response('NOT FOUND', 404)
+        
+        if request.args.get('stream'):
+            def frames():
+                version = -1
+                while version != job.version or job.state != 'done':
+                    version = job.wait(version, JobsAPI.max_wait)
+                    yield '%s\n' % json.dumps(job.info())
+            return Response(frames(), mimetype='application/x-ndjson')
+        
+        wait = request.args.get('wait', type=float)
+        if wait:
+            job.join(min(wait, JobsAPI.max_wait))
+        return jsonify(**job.info())
+    
+    def delete(self, job_id):
+        """Forget a job along with its result, cancelling it if yet to be executed."""
+        if JobsAPI.jobs.cancel(job_id) is None:
+            return Response('NOT FOUND', 404)
+        return 'OK'
+
+class MetricsAPI(MethodView):
+    
+    """REST API view exposing metrics of SSH channels in Prometheus text format."""
+    
+    def get(self):
+        """Render counters and histograms along with current in-flight and queued commands of every SSH channel."""
+        in_flight, queued = dict(), dict()
+        for alias, chan in Channel.snapshot().items():
+            in_flight[alias] = chan.pending
+            queued[alias] = chan.queued()
+        
+        gauges = {
+            'sshpool_in_flight_requests': in_flight,
+            'sshpool_queued_requests': queued,
+        }
+        return Response(Channel.metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+class ProfilerAPI(MethodView):
+    
+    """REST API view toggling a sampling profiler of the daemon at runtime."""
+    
+    profiler = Profiler()
+    
+    def get(self):
+        """Render collapsed stacks sampled so far, along with state of profiler in X-Profiler-* headers."""
+        info = ProfilerAPI.profiler.info()
+        r = Response(ProfilerAPI.profiler.render(), mimetype='text/plain')
+        r.headers['X-Profiler-Running'] = str(int(info['running']))
+        r.headers['X-Profiler-Samples'] = str(info['samples'])
+        return r
+    
+    def put(self):
+        """Start profiler, pass interval=<seconds> between samples. Responds with 409 if already running."""
+        interval = request.args.get('interval', type=float) or 0.01
+        if interval <= 0:
+            return Response('BAD REQUEST', 400)
+        if not ProfilerAPI.profiler.start(interval):
+            return Response('CONFLICT', 409)
+        return 'OK'
+    
+    def delete(self):
+        """Stop profiler, keeping its samples around. Responds with 409 if not running."""
+        if not ProfilerAPI.profiler.stop():
+            return Response('CONFLICT', 409)
         return 'OK'
 
 class HTTP(object):
     
-    def __init__(self, host, port):
+    def __init__(self, host, port, unix_socket=None, unix_socket_mode=0o600):
         self.host = host
         self.port = port
+        self.unix_socket = unix_socket
+        self.unix_socket_mode = unix_socket_mode
         self.web = Flask('sshpool')
         self.enable_channel_api()
+        self.enable_cache_api()
+        self.enable_batch_api()
+        self.enable_commands_api()
+        self.enable_files_api()
+        self.enable_fanout_api()
+        self.enable_jobs_api()
+        self.enable_metrics_api()
+        self.enable_profiler_api()
     
     def enable_channel_api(self):
         view = API.as_view('api')
@@ -82,5 +544,71 @@ class HTTP(object):
         self.web.add_url_rule('/channels/<alias>', view_func=view, methods=['POST', ])
         self.web.add_url_rule('/channels/<alias>', view_func=view, methods=['DELETE', ])
     
-    def start(self, debug=False):  # pragma: no cover
-        self.web.run(host=self.host, port=self.port, debug=debug)
+    def enable_cache_api(self):
+        view = CacheAPI.as_view('cache')
+        self.web.add_url_rule('/channels/<alias>/cache', view_func=view, methods=['DELETE', ])
+    
+    def enable_batch_api(self):
+        view = Batch.as_view('batch')
+        self.web.add_url_rule('/channels/<alias>/batch', view_func=view, methods=['POST', ])
+    
+    def enable_commands_api(self):
+        view = Commands.as_view('commands')
+        self.web.add_url_rule('/channels/<alias>/commands/<tag>', view_func=view, methods=['DELETE', ])
+    
+    def enable_files_api(self):
+        view = Files.as_view('files')
+        self.web.add_url_rule('/channels/<alias>/files', view_func=view, methods=['GET', 'HEAD', 'PUT', ])
+    
+    def enable_fanout_api(self):
+        view = FanOut.as_view('fanout')
+        self.web.add_url_rule('/fanout', view_func=view, methods=['POST', ])
+    
+    def enable_jobs_api(self):
+        view = JobsAPI.as_view('jobs')
+        self.web.add_url_rule('/channels/<alias>/jobs', view_func=view, methods=['POST', ])
+        self.web.add_url_rule('/jobs', defaults={'job_id': None}, view_func=view, methods=['GET', ])
+        self.web.add_url_rule('/jobs/<job_id>', view_func=view, methods=['GET', 'DELETE', ])
+    
+    def enable_metrics_api(self):
+        view = MetricsAPI.as_view('metrics')
+        self.web.add_url_rule('/metrics', view_func=view, methods=['GET', ])
+        
+        @self.web.before_request
+        def started():
+            g.started = time.time()
+        
+        @self.web.after_request
+        def finished(response):
+            if 'started' in g:
+                alias = (request.view_args or dict()).get('alias') or ''
+                Channel.metrics.observe('sshpool_http_request_duration_seconds', alias, time.time() - g.started)
+            return response
+    
+    def enable_profiler_api(self):
+        view = ProfilerAPI.as_view('profiler')
+        self.web.add_url_rule('/profiler', view_func=view, methods=['GET', 'PUT', 'DELETE', ])
+    
+    def start(self, debug=False, workers=0, drain_timeout=30):  # pragma: no cover
+        """Serve RESTful API until interrupted or terminated.
+        
+        Kwargs:
+            debug (bool): Enable Flask debug mode, applicable to development server only.
+            workers (int): Number of worker threads serving concurrent clients on each of TCP and Unix domain socket,
+                Flask development server is used if 0.
+            drain_timeout (float): Maximum seconds to wait for in-flight requests on shutdown.
+        
+        TCP is not listened on if port is None. Development server only listens on one of them, TCP if possible.
+        
+        """
+        if workers:
+            servers = list()
+            if self.port is not None:
+                servers.append(Server(self.host, self.port, self.web, workers))
+            if self.unix_socket:
+                servers.append(Server('unix://%s' % self.unix_socket, 0, self.web, workers, mode=self.unix_socket_mode))
+            serve(servers, drain_timeout)
+        elif self.port is not None:
+            self.web.run(host=self.host, port=self.port, debug=debug)
+        else:
+            self.web.run(host='unix://%s' % self.unix_socket, debug=debug)
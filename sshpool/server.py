@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.server
+    ~~~~~~~~~~~~~~
+
+    This module provides a multi-threaded WSGI server which keeps
+    client connections alive and drains in-flight requests on shutdown.
+    Idle keep-alive connections are polled rather than held by a worker.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import time
+import select
+import signal
+import socket
+import logging
+import threading
+from werkzeug import serving
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.server')
+
+class ChunkedWriter(object):
+    
+    """Writer framing every write as a chunk of HTTP/1.1 chunked transfer encoding."""
+    
+    def __init__(self, wfile):
+        self.wfile = wfile
+    
+    def write(self, data):
+        """Write data as a chunk."""
+        # an empty chunk would terminate the body
+        if data:
+            self.wfile.write(('%x\r\n' % len(data)).encode('ascii') + data + b'\r\n')
+    
+    def flush(self):
+        """Flush underlying file."""
+        self.wfile.flush()
+    
+    def end(self):
+        """Write last chunk, terminating the body."""
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+def completing(app):
+    """Wrap WSGI application, marking environ once its response body has been entirely produced."""
+    def wrapped(environ, start_response):
+        body = app(environ, start_response)
+        try:
+            for data in body:
+                yield data
+            environ['sshpool.completed'] = True
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+    return wrapped
+
+class RequestHandler(serving.WSGIRequestHandler):
+    
+    """HTTP/1.1 request handler serving many requests over a single client connection.
+    
+    Requests are served as they arrive, see serve, in between connection is handed back to server.
+    Responses of unknown length, e.g. streamed output of commands, are sent with chunked transfer encoding,
+    hence clients receive them as they are produced and connection is kept alive afterwards.
+    
+    """
+    
+    protocol_version = 'HTTP/1.1'
+    
+    # Seconds after which an idle client connection is closed, also bounds each read of a request.
+    timeout = 15
+    
+    def __init__(self, request, client_address, server):
+        """Set up client connection without serving any request yet."""
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+    
+    def serve(self):
+        """Serve requests readily available over client connection.
+        
+        Returns:
+            bool. Whether connection is to be kept alive, waiting for its next request.
+        
+        """
+        try:
+            self.close_connection = 1
+            self.handle_one_request()
+            while not self.close_connection and self.buffered():
+                self.handle_one_request()
+        except (socket.error, socket.timeout) as e:
+            self.connection_dropped(e)
+            return False
+        return not self.close_connection
+    
+    def buffered(self):
+        """Whether a pipelined request has already been read off the socket, where polling can not see it."""
+        rbuf = getattr(self.rfile, '_rbuf', None)
+        if rbuf is not None:
+            # Python 2 socket._fileobject keeps unread bytes at the start of _rbuf
+            return rbuf.tell() > 0
+        self.connection.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except (IOError, OSError):
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+    
+    def close(self):
+        """Close client connection."""
+        try:
+            self.finish()
+        except (IOError, OSError):
+            pass
+        self.server.shutdown_request(self.request)
+    
+    def handle_one_request(self):
+        """Handle a single HTTP request, closing client connection once server starts draining."""
+        ret = serving.WSGIRequestHandler.handle_one_request(self)
+        if self.server.draining:
+            self.close_connection = 1
+        return ret
+    
+    def parse_request(self):
+        """Parse request line and headers, noting time request has been received."""
+        self.started = time.time()
+        return serving.WSGIRequestHandler.parse_request(self)
+    
+    def make_environ(self):
+        """WSGI environ of request, carrying time request has been received under sshpool.started."""
+        environ = serving.WSGIRequestHandler.make_environ(self)
+        environ['sshpool.started'] = getattr(self, 'started', time.time())
+        return environ
+    
+    def run_wsgi(self):
+        """Run WSGI application, terminating a chunked body only if application produced all of it."""
+        self.chunked = False
+        self.header_keys = set()
+        wfile = self.wfile
+        try:
+            serving.WSGIRequestHandler.run_wsgi(self)
+        finally:
+            self.wfile = wfile
+        if not self.chunked:
+            return
+        
+        # a body cut short by an error must not look complete to client
+        if self.environ.get('sshpool.completed'):
+            try:
+                ChunkedWriter(wfile).end()
+            except (IOError, OSError) as e:
+                self.connection_dropped(e, self.environ)
+                self.close_connection = 1
+        else:
+            self.close_connection = 1
+    
+    def send_header(self, key, value):
+        """Send a header, replacing Connection: close sent for responses of unknown length by chunked transfer encoding."""
+        if key.lower() == 'connection' and value == 'close' and self.request_version == 'HTTP/1.1' \
+                and 'content-length' not in self.header_keys and 'transfer-encoding' not in self.header_keys:
+            self.chunked = True
+            self.close_connection = 0
+            key, value = 'Transfer-Encoding', 'chunked'
+        self.header_keys.add(key.lower())
+        serving.WSGIRequestHandler.send_header(self, key, value)
+    
+    def end_headers(self):
+        """End headers, framing body that follows as chunks if sent with chunked transfer encoding."""
+        serving.WSGIRequestHandler.end_headers(self)
+        if self.chunked:
+            self.wfile = ChunkedWriter(self.wfile)
+
+class Server(serving.BaseWSGIServer):
+    
+    """WSGI server handing over client connections to a fixed pool of worker threads.
+    
+    A worker serves a connection only once a request has arrived over it. Idle connections,
+    whether just accepted or kept alive, are polled by a single watcher thread instead,
+    hence more clients may keep connections open than there are workers.
+    
+    """
+    
+    multithread = True
+    request_queue_size = 1024
+    
+    def __init__(self, host, port, app, workers, mode=0o600):
+        """Initialize server and start worker threads.
+        
+        Args:
+            host (str): Listening interface, or unix:// followed by path of a Unix domain socket.
+            port (int): Listening port, ignored for Unix domain sockets.
+            app (callable): WSGI application.
+            workers (int): Number of worker threads serving client connections.
+        
+        Kwargs:
+            mode (int): Permissions of Unix domain socket file, which is replaced if it already exists.
+        
+        """
+        # socket file is created upon bind, restrict its permissions right from the start
+        umask = os.umask(0o777 & ~mode) if host.startswith('unix://') else None
+        try:
+            serving.BaseWSGIServer.__init__(self, host, port, completing(app), handler=RequestHandler)
+        finally:
+            if umask is not None:
+                os.umask(umask)
+        self.connections = queue.Queue()
+        self.draining = False
+        self.closing = False
+        self.parked = list()
+        self.idle = dict()
+        self.idle_lock = threading.Lock()
+        self.wakeup = os.pipe()
+        self.watcher = threading.Thread(target=self.watch)
+        self.watcher.daemon = True
+        self.watcher.start()
+        self.workers = list()
+        for i in range(workers):
+            worker = threading.Thread(target=self.work)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+    
+    @property
+    def url(self):
+        """Address server is listening on."""
+        if self.host.startswith('unix://'):
+            return self.host
+        return 'http://%s:%s/' % (self.host, self.port)
+    
+    def server_close(self):
+        """Close listening socket, removing socket file of a Unix domain socket."""
+        serving.BaseWSGIServer.server_close(self)
+        if self.host.startswith('unix://'):
+            try:
+                os.unlink(self.server_address)
+            except OSError:
+                pass
+    
+    def process_request(self, request, client_address):
+        """Hand over accepted client connection to watcher, until its first request arrives."""
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        self.park(handler)
+    
+    def park(self, handler):
+        """Hand over an idle client connection to watcher, closing it right away once server is draining."""
+        with self.idle_lock:
+            if not self.closing:
+                self.parked.append(handler)
+                os.write(self.wakeup[1], b'.')
+                return
+        handler.close()
+    
+    def watch(self):
+        """Poll idle client connections, queueing readable ones for next available worker.
+        
+        Connections idle for longer than timeout of request handler are closed, all of them once server is draining.
+        
+        """
+        poller = select.poll()
+        poller.register(self.wakeup[0], select.POLLIN)
+        while True:
+            with self.idle_lock:
+                closing, parked, self.parked = self.closing, self.parked, list()
+            for handler in parked:
+                fd = handler.connection.fileno()
+                self.idle[fd] = (handler, time.time() + handler.timeout)
+                poller.register(fd, select.POLLIN)
+            if closing:
+                break
+            
+            timeout = min([deadline for handler, deadline in self.idle.values()] or [time.time() + 1]) - time.time()
+            try:
+                events = poller.poll(max(0, timeout) * 1000)
+            except (IOError, OSError, select.error):
+                # interrupted by a signal
+                continue
+            for fd, event in events:
+                if fd == self.wakeup[0]:
+                    os.read(fd, 4096)
+                    continue
+                handler, deadline = self.idle.pop(fd)
+                poller.unregister(fd)
+                self.connections.put(handler)
+            
+            now = time.time()
+            for fd, (handler, deadline) in list(self.idle.items()):
+                if deadline <= now:
+                    del self.idle[fd]
+                    poller.unregister(fd)
+                    handler.close()
+        
+        for handler, deadline in self.idle.values():
+            handler.close()
+        self.idle.clear()
+        for fd in self.wakeup:
+            os.close(fd)
+    
+    def close_idle(self):
+        """Close idle client connections, and any which goes idle from now on."""
+        with self.idle_lock:
+            if self.closing:
+                return
+            self.closing = True
+            os.write(self.wakeup[1], b'.')
+    
+    def work(self):
+        """Serve requests of queued client connections until a None is dequeued."""
+        while True:
+            handler = self.connections.get()
+            if handler is None:
+                return
+            try:
+                keep_alive = handler.serve()
+            except Exception:
+                self.handle_error(handler.request, handler.client_address)
+                keep_alive = False
+            if keep_alive:
+                self.park(handler)
+            else:
+                handler.close()
+    
+    def stop(self, *args):
+        """Stop accepting new client connections, closing idle ones. Safe to be used as a signal handler."""
+        logger.info('stopping server on %s, no longer accepting connections' % self.url)
+        self.draining = True
+        
+        # acquiring locks within a signal handler could deadlock with the interrupted thread
+        def stopping():
+            self.close_idle()
+            self.shutdown()
+        stopper = threading.Thread(target=stopping)
+        stopper.daemon = True
+        stopper.start()
+    
+    def drain(self, timeout):
+        """Wait for queued and in-flight requests to finish.
+        
+        Args:
+            timeout (float): Maximum seconds to wait for.
+        
+        Returns:
+            bool. Whether all workers finished within timeout.
+        
+        """
+        self.draining = True
+        until = time.time() + timeout
+        self.close_idle()
+        self.watcher.join(max(0, until - time.time()))
+        for worker in self.workers:
+            self.connections.put(None)
+        for worker in self.workers:
+            worker.join(max(0, until - time.time()))
+        drained = not any(worker.is_alive() for worker in self.workers)
+        if not drained:
+            logger.warning('in-flight requests still pending after %s seconds, giving up' % timeout)
+        return drained
+    
+    def run(self, drain_timeout=30):
+        """Serve client connections until interrupted or terminated, finally draining in-flight requests.
+        
+        Kwargs:
+            drain_timeout (float): Maximum seconds to wait for in-flight requests on shutdown.
+        
+        """
+        serve([self], drain_timeout)
+
+def serve(servers, drain_timeout=30):
+    """Serve client connections over many listening servers until interrupted or terminated.
+    
+    In-flight requests of all of them are drained at the end.
+    
+    Args:
+        servers (list): Servers e.g. one listening on TCP and another on a Unix domain socket.
+    
+    Kwargs:
+        drain_timeout (float): Maximum seconds to wait for in-flight requests on shutdown.
+    
+    """
+    def stop(*args):
+        for server in servers:
+            server.stop()
+    signal.signal(signal.SIGTERM, stop)
+    
+    threads = list()
+    for server in servers:
+        logger.info(' * Running on %s with %d workers' % (server.url, len(server.workers)))
+    for server in servers[1:]:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    servers[0].serve_forever()
+    
+    # interrupted rather than terminated, remaining servers are still listening
+    for server in servers:
+        if not server.draining:
+            server.stop()
+    for thread in threads:
+        thread.join()
+    until = time.time() + drain_timeout
+    for server in servers:
+        server.drain(max(0, until - time.time()))
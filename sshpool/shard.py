@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+    sshpool.shard
+    ~~~~~~~~~~~~~
+
+    This module provides consistent hashing of channel aliases onto
+    a set of sshpoold instances, each owning a shard of aliases.
+
+    :copyright: (c) 2013 by Abhinav Singh.
+    :license: BSD, see LICENSE for more details.
+"""
+import bisect
+import struct
+import hashlib
+import logging
+import threading
+
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(message)s')
+logger = logging.getLogger('sshpool.shard')
+
+class Ring(object):
+    
+    """Consistent hash ring of shards.
+    
+    Every shard is placed at replicas points of the ring and an alias belongs to the shard
+    owning the first point following hash of the alias. Adding or removing a shard hence only
+    moves aliases between that shard and the others, roughly 1/N of all aliases for N shards.
+    
+    """
+    
+    def __init__(self, shards, replicas=160):
+        """Initialize ring.
+        
+        Args:
+            shards (list): Shard addresses e.g. 127.0.0.1:8877.
+        
+        Kwargs:
+            replicas (int): Points of ring per shard, more points spread aliases more evenly.
+        
+        """
+        assert shards, 'at least one shard is required'
+        self.shards = list(shards)
+        points = sorted((Ring.hash('%s#%d' % (shard, i)), shard) for shard in self.shards for i in range(replicas))
+        self.points = [point for point, shard in points]
+        self.owners = [shard for point, shard in points]
+    
+    @staticmethod
+    def hash(key):
+        """Position of key on ring, stable across processes and Python versions."""
+        return struct.unpack('>Q', hashlib.md5(key.encode('utf-8')).digest()[:8])[0]
+    
+    def shard(self, alias):
+        """Lookup shard owning alias.
+        
+        Returns:
+            str. Shard address.
+        
+        """
+        i = bisect.bisect(self.points, Ring.hash(alias))
+        return self.owners[i % len(self.owners)]
+
+class ShardMap(object):
+    
+    """Ring of shards loaded from a list of addresses or a shard map file, which can be reloaded at runtime."""
+    
+    def __init__(self, source, replicas=160):
+        """Initialize shard map.
+        
+        Args:
+            source (list or str): Shard addresses, or path of a file listing one address per line.
+                Blank lines and lines starting with # are ignored.
+        
+        Kwargs:
+            replicas (int): Same as Ring.
+        
+        """
+        self.source = source
+        self.replicas = replicas
+        self.lock = threading.Lock()
+        self.ring = None
+        self.reload()
+    
+    def reload(self):
+        """Rebuild ring from source, e.g. after a shard has been added to shard map file.
+        
+        Returns:
+            bool. Whether shards have changed.
+        
+        """
+        if isinstance(self.source, (list, tuple)):
+            shards = list(self.source)
+        else:
+            with open(self.source, 'rb') as f:
+                shards = [line.strip() for line in f.read().decode('utf-8').splitlines()]
+        shards = [shard for shard in shards if shard and not shard.startswith('#')]
+        
+        with self.lock:
+            if self.ring is not None and self.ring.shards == shards:
+                return False
+            self.ring = Ring(shards, self.replicas)
+        logger.info('loaded %d shards' % len(shards))
+        return True
+    
+    @property
+    def shards(self):
+        """Addresses of all shards."""
+        return self.ring.shards
+    
+    def shard(self, alias):
+        """Lookup shard owning alias, see Ring.shard."""
+        return self.ring.shard(alias)
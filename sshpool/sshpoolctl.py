@@ -8,6 +8,8 @@
     :copyright: (c) 2013 by Abhinav Singh.
     :license: BSD, see LICENSE for more details.
 """
+import os
+import sys
 import sshpool
 import argparse
 
@@ -15,15 +17,28 @@ from .ctl import Ctl
 
 def main():
     parser = argparse.ArgumentParser(
-        description='SSHPool interactive shell v%s' % sshpool.__version__,
+        description='SSHPool interactive shell and script runner v%s' % sshpool.__version__,
         epilog='Having difficulty using SSHPool? Report at: %s/issues/new' % sshpool.__homepage__
     )
-    parser.add_argument('--host', default='127.0.0.1', help='SSHPool interface (default: 127.0.0.1)')
+    parser.add_argument('--host', default='127.0.0.1', help='SSHPool interface, or unix:// followed by path of its Unix domain socket (default: 127.0.0.1)')
     parser.add_argument('--port', default=8877, type=int, help='SSHPool listening port (default: 8877)')
+    parser.add_argument('--shards', help='Shard map file listing address of one sshpoold instance per line, or comma separated addresses e.g. 127.0.0.1:8877,127.0.0.1:8878. Overrides --host and --port.')
+    parser.add_argument('script', nargs='?', type=argparse.FileType('r'), help='Script with one alias followed by command per line, - for stdin. Commands are run concurrently, their output lines prefixed by alias and exit status is the highest exit code of all commands.')
+    parser.add_argument('--parallel', default=8, type=int, help='Maximum number of script commands running at a time (default: 8)')
     args = parser.parse_args()
     
+    shards = None
+    if args.shards:
+        shards = args.shards if os.path.isfile(args.shards) else args.shards.split(',')
+    
+    if args.script:
+        try:
+            sys.exit(Ctl(args.host, args.port, shards).script(args.script, args.parallel))
+        except KeyboardInterrupt:
+            sys.exit(130)
+    
     try:
-        ctl = Ctl(args.host, args.port)
+        ctl = Ctl(args.host, args.port, shards)
         ctl.cmdloop()
     except KeyboardInterrupt as e:
         pass
@@ -1,3 +1,4 @@
+import os
 import time
 import mock
 import json
@@ -5,6 +6,8 @@ import unittest
 
 from .utils import TestObj
 from sshpool.rest import API, HTTP
+from sshpool.jobs import QueueFull
+from sshpool.channel import Channel, Unavailable
 
 class TestAPI(unittest.TestCase):
     
@@ -43,16 +46,238 @@ class TestAPI(unittest.TestCase):
         resp = json.loads(r.data)
         self.assertEqual(resp.keys(), ['dummy'])
     
+    def test_execute_batch(self):
+        r = self.app.post('/channels/dummy/batch', data=json.dumps({'commands': ['uname', 'nproc'], 'stop_on_failure': True}))
+        self.assertEqual(r.status_code, 200)
+        resp = json.loads(r.data)
+        self.assertEqual([result['stdout'] for result in resp['results']], ['Hello World', 'Hello World'])
+        self.assertEqual(resp['exit_code'], 0)
+    
+    def test_execute_batch_failure(self):
+        r = self.app.post('/channels/dummy/batch', data='uname')
+        self.assertEqual(r.status_code, 400)
+        r = self.app.post('/channels/non-existent-alias/batch', data=json.dumps({'commands': ['uname']}))
+        self.assertEqual(r.status_code, 404)
+    
+    def test_execute_cmd_cached(self):
+        r = self.app.post('/channels/dummy?cache=30', data='uname')
+        self.assertEqual(r.headers['X-Cache'], 'MISS')
+        r = self.app.post('/channels/dummy?cache=30', data='uname')
+        self.assertEqual(r.headers['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(r.data)['stdout'], 'Hello World')
+        r = self.app.get('/channels/dummy')
+        self.assertEqual(json.loads(r.data)['cache'], {'hits': 1, 'misses': 1})
+        r = self.app.delete('/channels/dummy/cache')
+        self.assertEqual(r.status_code, 200)
+        r = self.app.post('/channels/dummy?cache=30', data='uname')
+        self.assertEqual(r.headers['X-Cache'], 'MISS')
+    
+    def test_execute_cmd_released(self):
+        chan = Channel.channels['dummy']
+        r = self.app.post('/channels/dummy?cache=30', data='hostname')
+        self.assertEqual(r.headers['X-Cache'], 'MISS')
+        with mock.patch.object(Channel, 'get') as mock_get:
+            for i in range(2):
+                r = self.app.post('/channels/dummy?cache=30', data='hostname')
+                self.assertEqual(r.headers['X-Cache'], 'HIT')
+            self.assertFalse(mock_get.called)
+        self.assertEqual(chan.reserved, 0)
+        r = self.app.post('/channels/dummy?stream=1', data='uname')
+        r.close()
+        self.assertEqual(chan.reserved, 0)
+    
+    def test_reregister_invalidates_cache(self):
+        self.assertEqual(self.app.post('/channels', data='moved://old.host?lazy=1').data, 'OK')
+        API.cache.put('moved', 'uname', {'stdout': 'old', 'stderr': '', 'exit_code': 0})
+        self.assertEqual(self.app.post('/channels', data='moved://new.host?lazy=1').data, 'OK')
+        self.assertIsNone(API.cache.get('moved', 'uname'))
+        Channel.unregister(Channel.channels['moved'])
+    
     def test_execute_cmd_failure(self):
         r = self.app.post('/channels/non-existent-alias', 'echo Hello World')
         self.assertEqual(r.status_code, 404)
     
+    def test_execute_cmd_cancel(self):
+        r = self.app.delete('/channels/dummy/commands/unknown')
+        self.assertEqual(r.status_code, 404)
+        r = self.app.delete('/channels/non-existent-alias/commands/unknown')
+        self.assertEqual(r.status_code, 404)
+    
     def test_execute_cmd_success(self):
         r = self.app.post('/channels/dummy', 'echo Hello World')
         self.assertEqual(r.status_code, 200)
         resp = json.loads(r.data)
         self.assertEqual(resp['stdout'], 'Hello World')
     
+    def test_execute_cmd_timings(self):
+        r = self.app.post('/channels/dummy', 'echo Hello World')
+        timings = json.loads(r.data)['timings']
+        self.assertTrue(set(['parse', 'pipe', 'queue', 'reply', 'total']) <= set(timings))
+        self.assertTrue(all(0 <= duration <= timings['total'] for duration in timings.values()))
+        phases = [phase.split(';dur=')[0] for phase in r.headers['Server-Timing'].split(', ')]
+        self.assertEqual(phases, [phase for phase in API.phases if phase in timings])
+        
+        r = self.app.post('/channels/dummy?cache=30', data='uname')
+        r = self.app.post('/channels/dummy?cache=30', data='uname')
+        self.assertEqual(r.headers['X-Cache'], 'HIT')
+        self.assertEqual(set(json.loads(r.data)['timings']), set(['parse', 'total']))
+    
+    @mock.patch('sshpool.rest.Channel.execute')
+    def test_execute_cmd_raw(self, mock_execute):
+        chan = Channel('raw://dummy.host')
+        chan.spill_threshold = 4
+        mock_execute.return_value = chan.spill({'stdout': 'Hello World', 'stderr': 'oops!', 'exit_code': 0})
+        paths = [desc['path'] for desc in mock_execute.return_value['spill'].values()]
+        r = self.app.post('/channels/dummy?raw=stdout', data='echo Hello World')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data, 'Hello World')
+        self.assertEqual(r.headers['X-Exit-Code'], '0')
+        mock_execute.assert_called_once_with('echo Hello World', spill=True, timeout=None, tag=None)
+        self.assertFalse(any(os.path.exists(path) for path in paths))
+        
+        mock_execute.return_value = chan.spill({'stdout': 'Hello World', 'stderr': '', 'exit_code': 0})
+        path = mock_execute.return_value['spill']['stdout']['path']
+        API.raw(mock_execute.return_value, 'stdout').close()
+        self.assertFalse(os.path.exists(path))
+    
+    def test_execute_cmd_raw_bad_request(self):
+        r = self.app.post('/channels/dummy?raw=stdin', data='echo Hello World')
+        self.assertEqual(r.status_code, 400)
+    
+    @mock.patch('sshpool.rest.Channel.get')
+    def test_execute_cmd_unavailable(self, mock_get):
+        mock_get.side_effect = Unavailable('dummy', 2.5)
+        r = self.app.post('/channels/dummy', 'echo Hello World')
+        self.assertEqual(r.status_code, 503)
+        self.assertEqual(r.headers['Retry-After'], '3')
+    
+    @mock.patch('sshpool.rest.Channel.stream')
+    def test_execute_cmd_stream(self, mock_stream):
+        mock_stream.return_value = iter([{'stdout': 'Hello '}, {'stdout': 'World'}, {'exit_code': 0}])
+        r = self.app.post('/channels/dummy?stream=1', data='echo Hello World')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'application/x-ndjson')
+        frames = [json.loads(line) for line in r.data.splitlines()]
+        self.assertEqual(set(frames[-1].pop('timings')), set(['parse', 'total']))
+        self.assertEqual(frames, [{'stdout': 'Hello '}, {'stdout': 'World'}, {'exit_code': 0}])
+        mock_stream.assert_called_once_with('echo Hello World', timeout=None, tag=None)
+    
+    def test_fanout(self):
+        r = self.app.post('/fanout', data=json.dumps({'cmd': 'echo Hello World', 'select': 'dum*', 'aliases': ['unknown']}))
+        self.assertEqual(r.status_code, 200)
+        frames = sorted([json.loads(line) for line in r.data.splitlines()], key=lambda resp: resp['alias'])
+        self.assertEqual(len(frames), 2)
+        self.assertDictContainsSubset({'alias': 'dummy', 'stdout': 'Hello World'}, frames[0])
+        self.assertDictContainsSubset({'alias': 'unknown'}, frames[1])
+    
+    def test_fanout_bad_request(self):
+        r = self.app.post('/fanout', data='echo Hello World')
+        self.assertEqual(r.status_code, 400)
+        for params in ({'deadline': '5'}, {'deadline': 0}, {'concurrency': '4'}, {'concurrency': -1}, {'concurrency': 2.5}, {'aliases': 'dummy'}):
+            r = self.app.post('/fanout', data=json.dumps(dict(params, cmd='uname', aliases=params.get('aliases', ['dummy']))))
+            self.assertEqual(r.status_code, 400)
+        r = self.app.post('/fanout', data=json.dumps({'cmd': 'uname', 'aliases': ['unknown'], 'deadline': 5, 'concurrency': 4}))
+        self.assertEqual(r.status_code, 200)
+    
+    @mock.patch('sshpool.rest.Channel.download')
+    def test_file_download(self, mock_download):
+        def frames(path, offset, length):
+            yield {'size': 11, 'offset': 6, 'length': 5}
+            yield {'data': 'Worl'}
+            yield {'data': 'd'}
+            yield {'exit_code': 0, 'size': 5}
+        mock_download.side_effect = frames
+        r = self.app.get('/channels/dummy/files?path=hello.txt', headers={'Range': 'bytes=6-'})
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.data, 'World')
+        self.assertEqual(r.headers['Content-Range'], 'bytes 6-10/11')
+        mock_download.assert_called_once_with('hello.txt', 6, None)
+    
+    @mock.patch('sshpool.rest.Channel.download')
+    def test_file_download_failure(self, mock_download):
+        mock_download.return_value = iter([{'exception': "IOError(2, 'No such file')", 'errno': 2}])
+        r = self.app.get('/channels/dummy/files?path=missing.txt')
+        self.assertEqual(r.status_code, 404)
+        r = self.app.get('/channels/dummy/files')
+        self.assertEqual(r.status_code, 400)
+    
+    @mock.patch('sshpool.rest.Channel.stat')
+    def test_file_stat(self, mock_stat):
+        mock_stat.return_value = {'exit_code': 0, 'size': 11, 'mtime': 1373992366}
+        r = self.app.head('/channels/dummy/files?path=hello.txt')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['Content-Length'], '11')
+    
+    @mock.patch('sshpool.rest.Channel.upload')
+    def test_file_upload(self, mock_upload):
+        chunks = list()
+        def upload(path, data, offset):
+            chunks.extend(data)
+            return {'exit_code': 0, 'size': offset + len(''.join(chunks))}
+        mock_upload.side_effect = upload
+        r = self.app.put('/channels/dummy/files?path=hello.txt&offset=5', data=' World')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(json.loads(r.data), {'exit_code': 0, 'size': 11})
+        self.assertEqual(''.join(chunks), ' World')
+    
+    def test_job(self):
+        r = self.app.post('/channels/dummy/jobs', data='echo Hello World')
+        self.assertEqual(r.status_code, 202)
+        job = json.loads(r.data)
+        self.assertEqual(r.headers['Location'].split('/')[-2:], ['jobs', job['id']])
+        r = self.app.get('/jobs/%s?wait=5' % job['id'])
+        self.assertEqual(r.status_code, 200)
+        resp = json.loads(r.data)
+        self.assertEqual(resp['state'], 'done')
+        self.assertEqual(resp['result']['stdout'], 'Hello World')
+        r = self.app.get('/jobs/%s?stream=1' % job['id'])
+        self.assertEqual([json.loads(line)['state'] for line in r.data.splitlines()], ['done'])
+        r = self.app.get('/jobs')
+        self.assertIn(job['id'], json.loads(r.data))
+        r = self.app.delete('/jobs/%s' % job['id'])
+        self.assertEqual(r.status_code, 200)
+        r = self.app.get('/jobs/%s' % job['id'])
+        self.assertEqual(r.status_code, 404)
+    
+    @mock.patch('sshpool.rest.JobsAPI.jobs')
+    def test_job_queue_full(self, mock_jobs):
+        mock_jobs.submit.side_effect = QueueFull('dummy', 7)
+        r = self.app.post('/channels/dummy/jobs', data='echo Hello World')
+        self.assertEqual(r.status_code, 429)
+        self.assertEqual(r.headers['Retry-After'], '7')
+        r = self.app.post('/channels/non-existent-alias/jobs', data='echo Hello World')
+        self.assertEqual(r.status_code, 404)
+    
+    def test_metrics(self):
+        self.app.post('/channels/dummy', 'echo Hello World')
+        r = self.app.get('/metrics')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.mimetype, 'text/plain')
+        self.assertIn('sshpool_commands_total{alias="dummy"}', r.data)
+        self.assertIn('sshpool_stdout_bytes_total{alias="dummy"}', r.data)
+        self.assertIn('sshpool_command_duration_seconds_count{alias="dummy"}', r.data)
+        self.assertIn('sshpool_pipe_wait_seconds_count{alias="dummy"}', r.data)
+        self.assertIn('sshpool_in_flight_requests{alias="dummy"} 0\n', r.data)
+        self.assertIn('sshpool_queued_requests{alias="dummy"} 0\n', r.data)
+    
+    def test_profiler(self):
+        r = self.app.delete('/profiler')
+        self.assertEqual(r.status_code, 409)
+        r = self.app.put('/profiler?interval=-1')
+        self.assertEqual(r.status_code, 400)
+        r = self.app.put('/profiler?interval=0.001')
+        self.assertEqual(r.status_code, 200)
+        r = self.app.put('/profiler')
+        self.assertEqual(r.status_code, 409)
+        time.sleep(0.05)
+        r = self.app.delete('/profiler')
+        self.assertEqual(r.status_code, 200)
+        r = self.app.get('/profiler')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['X-Profiler-Running'], '0')
+        self.assertGreater(int(r.headers['X-Profiler-Samples']), 0)
+        self.assertRegexpMatches(r.data.splitlines()[0], r' \d+$')
+    
     def test_stop_channel_failure(self):
         r = self.app.delete('/channels/non-existent-alias')
         self.assertEqual(r.status_code, 404)
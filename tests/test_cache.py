@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from sshpool.cache import Cache
+
+def output(stdout, exit_code=0):
+    return {'stdout': stdout, 'stderr': '', 'exit_code': exit_code}
+
+class TestCache(unittest.TestCase):
+    
+    def test_hit_miss(self):
+        cache = Cache()
+        self.assertIsNone(cache.get('dummy', 'uname'))
+        cache.put('dummy', 'uname', output('Linux'))
+        self.assertEqual(cache.get('dummy', 'uname'), output('Linux'))
+        self.assertIsNone(cache.get('other', 'uname'))
+        self.assertEqual(cache.info('dummy'), {'hits': 1, 'misses': 1})
+        self.assertEqual(cache.info('other'), {'hits': 0, 'misses': 1})
+    
+    def test_failures_not_cached(self):
+        cache = Cache()
+        cache.put('dummy', 'false', output('', 1))
+        cache.put('dummy', 'ls', {'exception': 'SSHException()'})
+        self.assertEqual(len(cache.entries), 0)
+    
+    def test_ttl(self):
+        cache = Cache(ttl=0.1)
+        cache.put('dummy', 'uname', output('Linux'))
+        cache.put('dummy', 'nproc', output('4'), ttl=10)
+        time.sleep(0.15)
+        self.assertIsNone(cache.get('dummy', 'uname'))
+        self.assertEqual(cache.get('dummy', 'nproc'), output('4'))
+        self.assertEqual(cache.bytes, len('nproc') + len('4'))
+    
+    def test_lru_entries(self):
+        cache = Cache(max_entries=2)
+        cache.put('dummy', 'uname', output('Linux'))
+        cache.put('dummy', 'nproc', output('4'))
+        cache.get('dummy', 'uname')
+        cache.put('dummy', 'hostname', output('dummy.host'))
+        self.assertEqual(list(cache.entries), [('dummy', 'uname'), ('dummy', 'hostname')])
+    
+    def test_lru_bytes(self):
+        cache = Cache(max_bytes=20)
+        cache.put('dummy', 'uname', output('Linux'))
+        cache.put('dummy', 'nproc', output('4'))
+        cache.put('dummy', 'hostname', output('dummy.host'))
+        self.assertEqual(list(cache.entries), [('dummy', 'hostname')])
+        cache.put('dummy', 'cat /var/log/syslog', output('x' * 20))
+        self.assertEqual(list(cache.entries), [('dummy', 'hostname')])
+        self.assertEqual(cache.bytes, 18)
+    
+    def test_invalidate(self):
+        cache = Cache()
+        cache.put('dummy', 'uname', output('Linux'))
+        cache.put('other', 'uname', output('Linux'))
+        cache.invalidate('dummy')
+        self.assertEqual(list(cache.entries), [('other', 'uname')])
+        self.assertEqual(cache.bytes, 10)
+    
+    def test_allow(self):
+        cache = Cache(allow=['^uname( |$)', '^cat /etc/os-release$'])
+        self.assertTrue(cache.allowed('uname -a'))
+        self.assertTrue(cache.allowed('cat /etc/os-release'))
+        self.assertFalse(cache.allowed('unamex'))
+        self.assertFalse(cache.allowed('rm -rf /tmp/x'))
@@ -0,0 +1,120 @@
+import os
+import shutil
+import mock
+import tempfile
+import unittest
+import threading
+
+from sshpool.rest import HTTP
+from sshpool.server import Server
+from sshpool.client import Client, AsyncClient, asyncio
+
+class TestClient(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = Server('127.0.0.1', 0, HTTP('127.0.0.1', 0).web, 4)
+        self.server.accepted = 0
+        process_request = self.server.process_request
+        def count(request, client_address):
+            self.server.accepted += 1
+            process_request(request, client_address)
+        self.server.process_request = count
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+    
+    def tearDown(self):
+        self.server.stop()
+        self.thread.join()
+        self.server.drain(1)
+    
+    def test_connection_reuse(self):
+        client = Client('127.0.0.1', self.server.port, pool_size=2, timeout=5)
+        for i in range(3):
+            self.assertEqual(client.status(None).status_code, 200)
+        self.assertEqual(client.status('non-existent-alias').status_code, 404)
+        self.assertEqual(client.stop('non-existent-alias').status_code, 404)
+        self.assertEqual(self.server.accepted, 1)
+        client.close()
+    
+    def test_connection_failure(self):
+        client = Client('127.0.0.1', 1, timeout=1)
+        self.assertIsNone(client.status(None))
+    
+    def test_sharded(self):
+        other = Server('127.0.0.1', 0, HTTP('127.0.0.1', 0).web, 4)
+        thread = threading.Thread(target=other.serve_forever)
+        thread.start()
+        try:
+            shards = ['127.0.0.1:%d' % self.server.port, '127.0.0.1:%d' % other.port]
+            client = Client(None, None, timeout=5, shards=shards)
+            self.assertEqual(client.shards(), ['http://%s' % shard for shard in shards])
+            owner = client.route('web1')
+            self.assertEqual(client.url('/channels/web1/batch'), '%s/channels/web1/batch' % owner)
+            self.assertEqual(client.status('web1').url, '%s/channels/web1' % owner)
+            
+            r = client.status(None)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.json(), dict())
+            self.assertNotIn('X-Failed-Shards', r.headers)
+            self.assertEqual(list(client.fanout('uname', aliases=['web1'])), [{'alias': 'web1', 'exception': 'channel web1 not found'}])
+            self.assertEqual(client.job('unknown').status_code, 404)
+            client.close()
+            
+            client = Client(None, None, timeout=1, shards=shards + ['127.0.0.1:1'])
+            r = client.status(None)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.headers['X-Failed-Shards'], 'http://127.0.0.1:1')
+            frames = list(client.fanout('uname', select='web*'))
+            self.assertEqual(frames, [{'exception': 'shard http://127.0.0.1:1 unreachable'}])
+            client.close()
+        finally:
+            other.stop()
+            thread.join()
+            other.drain(1)
+    
+    def test_unix_socket(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'sshpool.sock')
+        server = Server('unix://%s' % path, 0, HTTP('127.0.0.1', 0).web, 2)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            client = Client('unix://%s' % path, None, timeout=5)
+            self.assertEqual(client.base_url, 'http+unix://%s' % path.replace('/', '%2F'))
+            for i in range(3):
+                self.assertEqual(client.status(None).status_code, 200)
+            self.assertEqual(client.status('non-existent-alias').status_code, 404)
+            self.assertEqual(client.session.get_adapter(client.base_url).pools[path].num_connections, 1)
+            client.close()
+            
+            client = Client('unix://%s' % os.path.join(tmp, 'missing.sock'), None, timeout=1)
+            self.assertIsNone(client.status(None))
+        finally:
+            server.stop()
+            thread.join()
+            server.drain(1)
+            shutil.rmtree(tmp)
+    
+    def test_async_client_threads(self):
+        client = AsyncClient('127.0.0.1', self.server.port, concurrency=4)
+        client.loop = None
+        with mock.patch('sshpool.client.asyncio', None):
+            futures = [client.status(None) for i in range(8)] + [client.status('non-existent-alias')]
+            self.assertEqual([f.result(5).status_code for f in futures], [200] * 8 + [404])
+            failed = client.call(client.client.job, None, None, 'alias', 'unexpected')
+            self.assertRaises(TypeError, failed.result, 5)
+        self.assertEqual(len(client.workers), 4)
+        self.assertLessEqual(self.server.accepted, 4)
+        client.close()
+        self.assertEqual(client.workers, [])
+    
+    @unittest.skipIf(asyncio is None, 'asyncio not available')
+    def test_async_client(self):
+        client = AsyncClient('127.0.0.1', self.server.port, concurrency=4)
+        loop = asyncio.new_event_loop()
+        client.loop = loop
+        responses = loop.run_until_complete(asyncio.gather(*[client.status(None) for i in range(8)]))
+        self.assertEqual([r.status_code for r in responses], [200] * 8)
+        self.assertLessEqual(self.server.accepted, 4)
+        client.close()
+        loop.close()
@@ -0,0 +1,63 @@
+import mock
+import time
+import unittest
+import StringIO
+
+from sshpool.ctl import Ctl
+
+def stream(alias, cmd):
+    if alias == 'unknown':
+        yield {'exception': 'HTTP 404'}
+        return
+    time.sleep(0.05)
+    yield {'stdout': 'hello '}
+    yield {'stdout': 'world\n%s' % alias}
+    yield {'stderr': 'warning\n'}
+    yield {'exit_code': int(cmd.split()[-1])}
+
+class TestCtl(unittest.TestCase):
+    
+    def setUp(self):
+        self.ctl = Ctl('127.0.0.1', 8877)
+        self.ctl.stdout = StringIO.StringIO()
+        self.ctl.stderr = StringIO.StringIO()
+    
+    @mock.patch('sshpool.client.Client.stream')
+    def test_script(self, mock_stream):
+        mock_stream.side_effect = stream
+        script = StringIO.StringIO('# comment\n\nweb1 exit 0\nweb2\texit 3\n')
+        self.assertEqual(self.ctl.script(script, parallel=2), 3)
+        self.assertEqual(sorted(self.ctl.stdout.getvalue().splitlines()), ['web1\thello world', 'web1\tweb1', 'web2\thello world', 'web2\tweb2'])
+        self.assertEqual(sorted(self.ctl.stderr.getvalue().splitlines()), ['web1\twarning', 'web2\texit code 3', 'web2\twarning'])
+        self.assertEqual(sorted(call[0] for call in mock_stream.call_args_list), [('web1', 'exit 0'), ('web2', 'exit 3')])
+    
+    @mock.patch('sshpool.client.Client.stream')
+    def test_script_concurrent(self, mock_stream):
+        mock_stream.side_effect = stream
+        script = StringIO.StringIO(''.join('web%d exit 0\n' % i for i in range(8)))
+        start = time.time()
+        self.assertEqual(self.ctl.script(script, parallel=4), 0)
+        self.assertLess(time.time() - start, 0.2)
+        self.assertEqual(len(self.ctl.stdout.getvalue().splitlines()), 16)
+    
+    @mock.patch('sshpool.client.Client.stream')
+    def test_script_failures(self, mock_stream):
+        mock_stream.side_effect = stream
+        self.assertEqual(self.ctl.script(StringIO.StringIO('unknown exit 0\nweb1\n')), Ctl.failed)
+        self.assertEqual(sorted(self.ctl.stderr.getvalue().splitlines()), ['unknown\tHTTP 404', 'web1\tmissing command'])
+        mock_stream.return_value = iter([])
+        mock_stream.side_effect = None
+        self.assertEqual(self.ctl.script(StringIO.StringIO('web1 uptime\n')), Ctl.failed)
+        self.assertIn('web1\tno response', self.ctl.stderr.getvalue())
+    
+    @mock.patch('sshpool.client.Client.stream')
+    def test_script_exceptions(self, mock_stream):
+        def broken(alias, cmd):
+            if alias == 'web1':
+                raise ValueError('No JSON object could be decoded')
+            return stream(alias, cmd)
+        mock_stream.side_effect = broken
+        script = StringIO.StringIO(''.join('web%d exit 0\n' % (i % 2) for i in range(6)))
+        self.assertEqual(self.ctl.script(script, parallel=2), Ctl.failed)
+        self.assertEqual(self.ctl.stderr.getvalue().count("web1\tValueError('No JSON object could be decoded',)"), 3)
+        self.assertEqual(self.ctl.stdout.getvalue().count('web0\thello world'), 3)
@@ -0,0 +1,100 @@
+import time
+import mock
+import threading
+import unittest
+
+from sshpool.jobs import Jobs, QueueFull
+
+def output(stdout, exit_code=0):
+    return {'stdout': stdout, 'stderr': '', 'exit_code': exit_code}
+
+class TestJobs(unittest.TestCase):
+    
+    @mock.patch('sshpool.jobs.Channel.get')
+    def test_submit(self, mock_get):
+        mock_get.return_value.execute.return_value = output('Linux')
+        jobs = Jobs()
+        job = jobs.submit('dummy', 'uname', 1)
+        self.assertTrue(job.join(5))
+        self.assertEqual(job.result, output('Linux'))
+        self.assertEqual(jobs.get(job.id).info()['result'], output('Linux'))
+        self.assertLessEqual(job.submitted, job.started)
+        self.assertLessEqual(job.started, job.finished)
+        mock_get.assert_called_once_with('dummy')
+    
+    @mock.patch('sshpool.jobs.Channel.get')
+    def test_channel_not_found(self, mock_get):
+        mock_get.side_effect = KeyError('dummy')
+        job = Jobs().submit('dummy', 'uname', 1)
+        self.assertTrue(job.join(5))
+        self.assertIn('exception', job.result)
+    
+    @mock.patch('sshpool.jobs.Channel.get')
+    def test_queue_full(self, mock_get):
+        release = threading.Event()
+        mock_get.return_value.execute.side_effect = lambda cmd, **kwargs: release.wait(5) and output(cmd)
+        jobs = Jobs(max_queued=2)
+        running = jobs.submit('dummy', 'sleep', 1)
+        while running.state != 'running':
+            time.sleep(0.01)
+        queued = [jobs.submit('dummy', 'uname', 1), jobs.submit('dummy', 'nproc', 1)]
+        jobs.durations['dummy'] = 2.5
+        with self.assertRaises(QueueFull) as ctx:
+            jobs.submit('dummy', 'hostname', 1)
+        self.assertEqual(ctx.exception.retry_after, 8)
+        self.assertEqual(jobs.info('dummy'), {'queued': 2, 'workers': 1})
+        jobs.submit('other', 'hostname', 1)
+        
+        jobs.cancel(queued[0].id)
+        self.assertEqual(queued[0].state, 'done')
+        self.assertIsNone(jobs.get(queued[0].id))
+        release.set()
+        self.assertTrue(queued[1].join(5))
+        self.assertEqual(queued[1].result, output('nproc'))
+        self.assertEqual(mock_get.return_value.execute.call_count, 3)
+    
+    @mock.patch('sshpool.jobs.Channel.get')
+    def test_retry_after(self, mock_get):
+        release = threading.Event()
+        mock_get.return_value.execute.side_effect = lambda cmd, **kwargs: release.wait(5) and output(cmd)
+        retry_after = list()
+        for max_queued in (2, 8):
+            jobs = Jobs(max_queued=max_queued)
+            jobs.durations['dummy'] = 1.0
+            running = [jobs.submit('dummy', 'sleep', 2) for i in range(2)]
+            while any(job.state != 'running' for job in running):
+                time.sleep(0.01)
+            for i in range(max_queued):
+                jobs.submit('dummy', 'uname', 2)
+            with self.assertRaises(QueueFull) as ctx:
+                jobs.submit('dummy', 'uname', 2)
+            retry_after.append(ctx.exception.retry_after)
+        release.set()
+        self.assertEqual(retry_after, [2, 5])
+    
+    @mock.patch('sshpool.jobs.Channel.get')
+    def test_max_bytes(self, mock_get):
+        mock_get.return_value.execute.side_effect = lambda cmd, **kwargs: output(cmd * 4)
+        jobs = Jobs(max_bytes=10)
+        first = jobs.submit('dummy', 'ab', 1)
+        first.join(5)
+        second = jobs.submit('dummy', 'cd', 1)
+        second.join(5)
+        self.assertIsNone(jobs.get(first.id))
+        self.assertEqual(jobs.get(second.id).result, output('cdcdcdcd'))
+        self.assertEqual(jobs.bytes, 8)
+        
+        large = jobs.submit('dummy', 'large', 1)
+        large.join(5)
+        self.assertIsNone(large.result['stdout'])
+        self.assertEqual(large.result['dropped'], 20)
+    
+    @mock.patch('sshpool.jobs.Channel.get')
+    def test_ttl(self, mock_get):
+        mock_get.return_value.execute.return_value = output('Linux')
+        jobs = Jobs(ttl=0.1)
+        job = jobs.submit('dummy', 'uname', 1)
+        job.join(5)
+        time.sleep(0.15)
+        self.assertIsNone(jobs.get(job.id))
+        self.assertEqual(jobs.bytes, 0)
@@ -0,0 +1,107 @@
+import os
+import stat
+import shutil
+import mock
+import tempfile
+import unittest
+
+from sshpool.journal import Journal
+from sshpool.channel import Channel
+
+class TestChan(object):
+    
+    def __init__(self, dsn, last_used):
+        self.dsn = dsn
+        self.last_used = last_used
+
+class TestJournal(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'sshpool.journal')
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    def test_load_missing(self):
+        self.assertEqual(Journal(self.path).load(), list())
+    
+    def test_replay(self):
+        journal = Journal(self.path)
+        journal.add('old', 'old://dummy.host', last_used=100)
+        journal.add('new', 'new://dummy.host', last_used=200)
+        journal.add('gone', 'gone://dummy.host', last_used=300)
+        journal.remove('gone')
+        journal.close()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+        
+        entries = Journal(self.path).load()
+        self.assertEqual([entry['alias'] for entry in entries], ['new', 'old'])
+        self.assertEqual(entries[0], {'alias': 'new', 'dsn': 'new://dummy.host', 'last_used': 200})
+    
+    def test_skips_corrupt_lines(self):
+        journal = Journal(self.path)
+        journal.add('dummy', 'dummy://dummy.host', last_used=100)
+        journal.close()
+        with open(self.path, 'ab') as f:
+            f.write('{"op": "add", "alias": "torn", "ds')
+        self.assertEqual([entry['alias'] for entry in Journal(self.path).load()], ['dummy'])
+    
+    def test_readd_keeps_last_used(self):
+        journal = Journal(self.path)
+        journal.add('dummy', 'dummy://dummy.host', last_used=100)
+        journal.add('dummy', 'dummy://dummy.host')
+        self.assertEqual(journal.records, 1)
+        journal.add('dummy', 'dummy://other.host')
+        journal.close()
+        self.assertEqual(Journal(self.path).load(), [{'alias': 'dummy', 'dsn': 'dummy://other.host', 'last_used': 100}])
+    
+    def test_sync(self):
+        journal = Journal(self.path, resolution=60)
+        journal.add('dummy', 'dummy://dummy.host', last_used=100)
+        journal.sync({'dummy': TestChan('dummy://dummy.host', 130), 'unknown': TestChan('unknown://dummy.host', 500)})
+        self.assertEqual(journal.records, 1)
+        journal.sync({'dummy': TestChan('dummy://dummy.host', 160)})
+        self.assertEqual(journal.records, 2)
+        journal.close()
+        self.assertEqual(Journal(self.path).load()[0]['last_used'], 160)
+    
+    def test_compact(self):
+        journal = Journal(self.path)
+        journal.add('dummy', 'dummy://dummy.host', last_used=100)
+        journal.remove('dummy')
+        journal.compact({'other': TestChan('other://dummy.host', 200)})
+        journal.add('new', 'new://dummy.host', last_used=300)
+        journal.close()
+        self.assertEqual(len(open(self.path).readlines()), 2)
+        self.assertEqual([entry['alias'] for entry in Journal(self.path).load()], ['new', 'other'])
+    
+    def test_compacts_when_grown(self):
+        journal = Journal(self.path)
+        journal.add('dummy', 'dummy://dummy.host', last_used=100)
+        for i in range(1100):
+            journal.append({'op': 'use', 'alias': 'dummy', 'last_used': 100 + i})
+        journal.close()
+        self.assertLess(len(open(self.path).readlines()), 100)
+        self.assertEqual(Journal(self.path).load()[0]['last_used'], 1199)
+    
+    @mock.patch('sshpool.channel.Channel.start')
+    def test_channel_dsn_round_trip(self, mock_start):
+        dsn = 'nopass://deploy@dummy.host'
+        Channel.journal = Journal(self.path)
+        try:
+            chan = Channel.init(dsn, start=False)
+            with mock.patch.object(chan, 'state', return_value='dead'):
+                chan = Channel.reconnect(chan)
+            with mock.patch.object(chan, 'terminate'), mock.patch.object(chan, 'join'):
+                self.assertTrue(Channel.evict(chan))
+            Channel.journal.close()
+            self.assertEqual([entry['dsn'] for entry in Journal(self.path).load()], [dsn])
+            
+            Channel.journal.compact(Channel.snapshot())
+            entries = Journal(self.path).load()
+            self.assertEqual([entry['dsn'] for entry in entries], [dsn])
+            self.assertIsNone(Channel(entries[0]['dsn']).password)
+        finally:
+            Channel.journal = None
+            Channel.unregister(Channel.channels['nopass'])
@@ -0,0 +1,41 @@
+import unittest
+
+from sshpool.metrics import Metrics
+
+class TestMetrics(unittest.TestCase):
+    
+    def setUp(self):
+        self.metrics = Metrics()
+    
+    def test_command(self):
+        self.metrics.command('dummy', 0.02, {'stdout': 'Hello World', 'stderr': '', 'exit_code': 0})
+        self.metrics.command('dummy', 2, {'stdout': '', 'stderr': 'not found', 'exit_code': 127})
+        self.metrics.command('dummy', 0.01, {'exception': 'channel dummy is not running'})
+        text = self.metrics.render()
+        self.assertIn('sshpool_commands_total{alias="dummy"} 3\n', text)
+        self.assertIn('sshpool_commands_failed_total{alias="dummy"} 2\n', text)
+        self.assertIn('sshpool_stdout_bytes_total{alias="dummy"} 11\n', text)
+        self.assertIn('sshpool_stderr_bytes_total{alias="dummy"} 9\n', text)
+    
+    def test_batch_output(self):
+        self.metrics.output('dummy', {'results': [{'stdout': 'a'}, {'stdout': 'bc'}], 'exit_code': 0})
+        self.assertIn('sshpool_stdout_bytes_total{alias="dummy"} 3\n', self.metrics.render())
+    
+    def test_histogram(self):
+        self.metrics.observe('sshpool_command_duration_seconds', 'dummy', 0.02)
+        self.metrics.observe('sshpool_command_duration_seconds', 'dummy', 2)
+        text = self.metrics.render()
+        self.assertIn('# TYPE sshpool_command_duration_seconds histogram\n', text)
+        self.assertIn('sshpool_command_duration_seconds_bucket{alias="dummy",le="0.01"} 0\n', text)
+        self.assertIn('sshpool_command_duration_seconds_bucket{alias="dummy",le="0.025"} 1\n', text)
+        self.assertIn('sshpool_command_duration_seconds_bucket{alias="dummy",le="2.5"} 2\n', text)
+        self.assertIn('sshpool_command_duration_seconds_bucket{alias="dummy",le="+Inf"} 2\n', text)
+        self.assertIn('sshpool_command_duration_seconds_count{alias="dummy"} 2\n', text)
+    
+    def test_gauges(self):
+        text = self.metrics.render({'sshpool_queued_requests': {'dummy': 4}})
+        self.assertIn('sshpool_queued_requests{alias="dummy"} 4\n', text)
+    
+    def test_label_escaping(self):
+        self.metrics.inc('sshpool_reconnects_total', 'a"b')
+        self.assertIn('sshpool_reconnects_total{alias="a\\"b"} 1\n', self.metrics.render())
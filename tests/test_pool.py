@@ -0,0 +1,103 @@
+import time
+import mock
+import unittest
+
+from sshpool.channel import Channel
+from sshpool.pool import Pool
+
+class TestPool(unittest.TestCase):
+    
+    def test_dsn_parsing(self):
+        pool = Channel.init('pooled://dummy.host?pool_min=2&pool_max=4', False)
+        self.assertIsInstance(pool, Pool)
+        self.assertEqual(pool.alias, 'pooled')
+        self.assertEqual(pool.pool_min, 2)
+        self.assertEqual(pool.pool_max, 4)
+        self.assertDictContainsSubset({'pooled': pool}, Channel.channels)
+        self.assertFalse(pool.is_alive())
+        del Channel.channels['pooled']
+    
+    def test_dsn_parsing_invalid_size(self):
+        with self.assertRaises(AssertionError):
+            Pool(Channel('pooled://dummy.host?pool_min=4&pool_max=2'))
+    
+    @mock.patch('sshpool.pool.Channel.is_alive')
+    @mock.patch('sshpool.pool.Channel.start')
+    def test_select_least_busy(self, mock_start, mock_is_alive):
+        mock_is_alive.return_value = True
+        pool = Pool(Channel('pooled://dummy.host?pool_min=3&pool_max=3'))
+        pool.start()
+        self.assertEqual(len(pool.members), 3)
+        self.assertEqual([chan.password for chan in pool.members], [None] * 3)
+        pool.members[0].pending = 2
+        pool.members[1].pending = 0
+        pool.members[2].pending = 1
+        self.assertIs(pool.select(), pool.members[1])
+    
+    @mock.patch('sshpool.pool.Channel.is_alive')
+    @mock.patch('sshpool.pool.Channel.start')
+    def test_grow_when_saturated(self, mock_start, mock_is_alive):
+        mock_is_alive.return_value = True
+        pool = Pool(Channel('pooled://dummy.host?sessions=1&pool_min=1&pool_max=2'))
+        pool.start()
+        pool.members[0].pending = 1
+        chan = pool.select()
+        self.assertEqual(len(pool.members), 2)
+        self.assertIs(chan, pool.members[1])
+        chan.pending = 1
+        pool.select()
+        self.assertEqual(len(pool.members), 2)
+    
+    @mock.patch('sshpool.pool.Channel.terminate')
+    @mock.patch('sshpool.pool.Channel.is_alive')
+    @mock.patch('sshpool.pool.Channel.start')
+    def test_shrink_when_idle(self, mock_start, mock_is_alive, mock_terminate):
+        mock_is_alive.return_value = True
+        pool = Pool(Channel('pooled://dummy.host?pool_min=1&pool_max=3&pool_idle=60'))
+        pool.start()
+        pool.spawn()
+        pool.spawn()
+        pool.members[0].last_used -= 120
+        pool.members[1].last_used -= 120
+        pool.shrink()
+        self.assertEqual(len(pool.members), 1)
+        self.assertEqual(mock_terminate.call_count, 2)
+    
+    @mock.patch('sshpool.pool.Channel.replies')
+    @mock.patch('sshpool.pool.Channel.submit')
+    @mock.patch('sshpool.pool.Channel.is_alive')
+    @mock.patch('sshpool.pool.Channel.start')
+    def test_close_early(self, mock_start, mock_is_alive, mock_submit, mock_replies):
+        mock_is_alive.return_value = True
+        closed = list()
+        
+        def replies(req_id):
+            try:
+                yield {'size': 11, 'offset': 0, 'length': 11}
+                yield {'data': 'Hello World'}
+            finally:
+                closed.append(req_id)
+        
+        # replies iterators are kept referenced, so that only an explicit close finishes them
+        opened = list()
+        mock_submit.side_effect = [1, 2]
+        mock_replies.side_effect = lambda req_id: opened.append(replies(req_id)) or opened[-1]
+        pool = Pool(Channel('pooled://dummy.host?pool_min=1&pool_max=1'))
+        pool.start()
+        for frames in (pool.stream('uname'), pool.download('hello.txt')):
+            next(frames)
+            frames.close()
+        self.assertEqual(closed, [1, 2])
+    
+    @mock.patch('sshpool.channel.Channel.exec_command')
+    @mock.patch('sshpool.channel.paramiko.SSHClient.connect')
+    def test_execute(self, mock_connect, mock_exec_command):
+        mock_connect.return_value = None
+        mock_exec_command.return_value = 'Hello World', '', 0
+        pool = Channel.init('pooled://dummy.host?pool_min=2&pool_max=2')
+        time.sleep(0.1)
+        self.assertTrue(pool.is_alive())
+        self.assertDictContainsSubset({'stdout': 'Hello World'}, pool.execute('echo Hello World'))
+        self.assertDictContainsSubset({'pool_size': 2, 'pending': 0}, pool.info())
+        pool.stop()
+        self.assertNotIn('pooled', Channel.channels)
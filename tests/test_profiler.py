@@ -0,0 +1,49 @@
+import time
+import threading
+import unittest
+
+from sshpool.profiler import Profiler
+
+class TestProfiler(unittest.TestCase):
+    
+    def setUp(self):
+        self.profiler = Profiler()
+    
+    def tearDown(self):
+        self.profiler.stop()
+    
+    def test_sample(self):
+        started, stopped = threading.Event(), threading.Event()
+        def spin_wait():
+            started.set()
+            stopped.wait()
+        thread = threading.Thread(target=spin_wait)
+        thread.start()
+        started.wait()
+        try:
+            self.profiler.sample()
+        finally:
+            stopped.set()
+            thread.join()
+        stacks = self.profiler.render().splitlines()
+        # idle threads left behind by other tests may share a stack, only the spinning one is known to be alone
+        spinning = [stack for stack in stacks if 'spin_wait (test_profiler.py:' in stack]
+        self.assertEqual([stack.rsplit(' ', 1)[1] for stack in spinning], ['1'])
+        self.assertFalse(any('test_sample (test_profiler.py:' in stack for stack in stacks))
+        self.assertTrue(all(int(stack.rsplit(' ', 1)[1]) >= 1 for stack in stacks))
+    
+    def test_start_stop(self):
+        self.assertFalse(self.profiler.stop())
+        self.assertTrue(self.profiler.start(0.001))
+        self.assertFalse(self.profiler.start(0.001))
+        self.assertTrue(self.profiler.running)
+        time.sleep(0.05)
+        self.assertTrue(self.profiler.stop())
+        info = self.profiler.info()
+        self.assertFalse(info['running'])
+        self.assertEqual(info['interval'], 0.001)
+        self.assertGreater(info['samples'], 0)
+        self.assertIn('test_start_stop (test_profiler.py:', self.profiler.render())
+        
+        self.assertTrue(self.profiler.start(0.001))
+        self.assertLessEqual(self.profiler.info()['samples'], 1)
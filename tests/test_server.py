@@ -0,0 +1,144 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import socket
+import requests
+import threading
+from flask import Flask, Response
+
+from sshpool.server import Server
+
+class TestServer(unittest.TestCase):
+    
+    def setUp(self):
+        self.web = Flask('test')
+        self.web.add_url_rule('/', 'index', lambda: 'OK')
+        self.web.add_url_rule('/slow', 'slow', lambda: time.sleep(0.3) or 'SLOW')
+        self.web.add_url_rule('/stream', 'stream', lambda: Response(self.lines(), mimetype='application/x-ndjson'))
+        self.web.add_url_rule('/broken', 'broken', lambda: Response(self.lines(fail=True)))
+        self.server = Server('127.0.0.1', 0, self.web, 2)
+        self.server.accepted = 0
+        process_request = self.server.process_request
+        def count(request, client_address):
+            self.server.accepted += 1
+            process_request(request, client_address)
+        self.server.process_request = count
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s' % self.server.port
+    
+    def lines(self, fail=False):
+        for i in range(3):
+            yield '%d\n' % i
+            time.sleep(0.1)
+        if fail:
+            raise ValueError('failed')
+    
+    def tearDown(self):
+        if self.thread.is_alive():
+            self.server.stop()
+            self.thread.join()
+        self.server.drain(1)
+    
+    def test_keep_alive(self):
+        session = requests.Session()
+        for i in range(3):
+            r = session.get(self.url + '/')
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r.text, 'OK')
+        self.assertEqual(self.server.accepted, 1)
+        session.close()
+    
+    def test_idle_connections(self):
+        sessions = [requests.Session() for i in range(3)]
+        start = time.time()
+        for session in sessions:
+            self.assertEqual(session.get(self.url + '/').text, 'OK')
+        for session in sessions:
+            self.assertEqual(session.get(self.url + '/').text, 'OK')
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(self.server.accepted, 3)
+        
+        self.server.stop()
+        self.thread.join()
+        start = time.time()
+        self.assertTrue(self.server.drain(5))
+        self.assertLess(time.time() - start, 1)
+        for session in sessions:
+            session.close()
+    
+    def test_pipelined_requests(self):
+        sock = socket.create_connection(('127.0.0.1', self.server.port))
+        sock.sendall(b'GET / HTTP/1.1\r\nHost: localhost\r\n\r\n' * 2)
+        f = sock.makefile('rb')
+        for i in range(2):
+            self.assertEqual(f.readline(), b'HTTP/1.1 200 OK\r\n')
+            length = 0
+            for line in iter(f.readline, b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            self.assertEqual(f.read(length), b'OK')
+        f.close()
+        sock.close()
+    
+    def test_chunked_stream(self):
+        session = requests.Session()
+        start = time.time()
+        r = session.get(self.url + '/stream', stream=True)
+        self.assertEqual(r.headers['Transfer-Encoding'], 'chunked')
+        arrived = [(line, time.time() - start) for line in r.iter_lines()]
+        self.assertEqual([line for line, at in arrived], ['0', '1', '2'])
+        self.assertLess(arrived[0][1], 0.1)
+        self.assertEqual(session.get(self.url + '/').text, 'OK')
+        self.assertEqual(self.server.accepted, 1)
+        
+        r = session.get(self.url + '/broken', stream=True)
+        self.assertRaises(requests.exceptions.ChunkedEncodingError, lambda: list(r.iter_lines()))
+        session.close()
+    
+    def test_concurrent_requests(self):
+        results = list()
+        threads = [threading.Thread(target=lambda: results.append(requests.get(self.url + '/slow').text)) for i in range(2)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['SLOW', 'SLOW'])
+        self.assertLess(time.time() - start, 0.55)
+    
+    def test_drain(self):
+        results = list()
+        client = threading.Thread(target=lambda: results.append(requests.get(self.url + '/slow').text))
+        client.start()
+        time.sleep(0.1)
+        self.server.stop()
+        self.thread.join()
+        self.assertTrue(self.server.drain(5))
+        client.join()
+        self.assertEqual(results, ['SLOW'])
+    
+    def test_unix_socket(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'sshpool.sock')
+            server = Server('unix://%s' % path, 0, self.web, 2, mode=0o660)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o660)
+            self.assertEqual(server.url, 'unix://%s' % path)
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(path)
+            sock.sendall('GET / HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+            self.assertTrue(sock.makefile().read().endswith('\r\n\r\nOK'))
+            sock.close()
+            
+            server.stop()
+            thread.join()
+            self.assertTrue(server.drain(1))
+            self.assertFalse(os.path.exists(path))
+        finally:
+            shutil.rmtree(tmp)
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from sshpool.shard import Ring, ShardMap
+
+class TestShard(unittest.TestCase):
+    
+    def setUp(self):
+        self.aliases = ['host%d' % i for i in range(2000)]
+    
+    def test_ring_balance(self):
+        ring = Ring(['127.0.0.1:%d' % port for port in range(8877, 8881)])
+        owned = dict()
+        for alias in self.aliases:
+            owned[ring.shard(alias)] = owned.get(ring.shard(alias), 0) + 1
+        self.assertEqual(len(owned), 4)
+        for count in owned.values():
+            self.assertGreater(count, len(self.aliases) / 4 * 0.7)
+            self.assertLess(count, len(self.aliases) / 4 * 1.3)
+    
+    def test_ring_stable(self):
+        shards = ['127.0.0.1:%d' % port for port in range(8877, 8881)]
+        ring = Ring(shards)
+        self.assertEqual(Ring(list(reversed(shards))).shard('host1'), ring.shard('host1'))
+        
+        grown = Ring(shards + ['127.0.0.1:8881'])
+        moved = [alias for alias in self.aliases if grown.shard(alias) != ring.shard(alias)]
+        self.assertLess(len(moved), len(self.aliases) / 5 * 1.3)
+        self.assertTrue(all(grown.shard(alias) == '127.0.0.1:8881' for alias in moved))
+    
+    def test_ring_empty(self):
+        self.assertRaises(AssertionError, Ring, [])
+    
+    def test_shard_map_reload(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'shards')
+            with open(path, 'wb') as f:
+                f.write('# sshpoold instances\n127.0.0.1:8877\n\n127.0.0.1:8878\n')
+            shard_map = ShardMap(path)
+            self.assertEqual(shard_map.shards, ['127.0.0.1:8877', '127.0.0.1:8878'])
+            self.assertFalse(shard_map.reload())
+            
+            with open(path, 'ab') as f:
+                f.write('127.0.0.1:8879\n')
+            self.assertTrue(shard_map.reload())
+            self.assertEqual(len(shard_map.shards), 3)
+            self.assertIn(shard_map.shard('host1'), shard_map.shards)
+        finally:
+            shutil.rmtree(tmp)
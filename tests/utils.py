@@ -1,8 +1,15 @@
-import mock
+import os
+import re
 import StringIO
 
 class TestObj(object): 
-    pass
+    
+    @staticmethod
+    def stat(size):
+        st = TestObj()
+        st.st_size = size
+        st.st_mtime = 1373992366
+        return st
 
 def exec_command(out, err, code):
     stdin = StringIO.StringIO()
@@ -10,8 +17,7 @@ def exec_command(out, err, code):
     stdin.seek(0)
     
     stdout = StringIO.StringIO()
-    stdout.channel = TestObj()
-    stdout.channel.recv_exit_status = mock.MagicMock(return_value=code)
+    stdout.channel = SSHChannel([out] if out else [], [err] if err else [], code)
     stdout.write(out)
     stdout.seek(0)
     
@@ -20,3 +26,135 @@ def exec_command(out, err, code):
     stderr.seek(0)
     
     return stdin, stdout, stderr
+
+class SSHChannel(object):
+    
+    """Stand-in for paramiko.Channel replaying chunks of stdout and stderr."""
+    
+    def __init__(self, out, err, code):
+        self.out = list(out)
+        self.err = list(err)
+        self.code = code
+        self.closed = False
+    
+    @property
+    def eof_received(self):
+        return not self.out and not self.err
+    
+    def recv_ready(self):
+        return len(self.out) > 0
+    
+    def recv(self, nbytes):
+        return self.out.pop(0)
+    
+    def recv_stderr_ready(self):
+        return len(self.err) > 0
+    
+    def recv_stderr(self, nbytes):
+        return self.err.pop(0)
+    
+    def recv_exit_status(self):
+        return self.code
+
+def stream_command(out, err, code):
+    stdin, stdout, stderr = exec_command('', '', code)
+    stdout.channel = SSHChannel(out, err, code)
+    return stdin, stdout, stderr
+
+class HungChannel(object):
+    
+    """Stand-in for paramiko.Channel of a command which never finishes after writing partial output, until closed."""
+    
+    eof_received = False
+    
+    def __init__(self, partial):
+        self.out = [partial] if partial else []
+        self.closed = False
+        self.r, self.w = os.pipe()
+    
+    def fileno(self):
+        return self.r
+    
+    def close(self):
+        self.closed = True
+        os.write(self.w, 'x')
+    
+    def recv_ready(self):
+        return len(self.out) > 0
+    
+    def recv(self, nbytes):
+        return self.out.pop(0)
+    
+    def recv_stderr_ready(self):
+        return False
+    
+    def recv_exit_status(self):
+        return -1
+
+def hung_command(partial):
+    stdin, stdout, stderr = exec_command('', '', -1)
+    stdout.channel = HungChannel(partial)
+    return stdin, stdout, stderr
+
+class SSHShell(SSHChannel):
+    
+    """Stand-in for paramiko.Channel running a shell, replying to each command with out, err and code."""
+    
+    eof_received = False
+    
+    def __init__(self, out, err, code):
+        SSHChannel.__init__(self, [], [], code)
+        self.reply = out, err
+        self.commands = list()
+    
+    def sendall(self, data):
+        self.commands.append(data)
+        marker = re.search(r'(__sshpool_\w+__)', data).group(1)
+        out, err = self.reply
+        self.out += [out, '\n%s' % marker, ' %d\n' % self.code]
+        self.err += [err, '\n%s\n' % marker]
+
+class SFTPFile(StringIO.StringIO):
+    
+    """Stand-in for paramiko.SFTPFile backed by a dict of file contents."""
+    
+    def __init__(self, files, path, mode):
+        StringIO.StringIO.__init__(self, '' if mode == 'w' else files[path])
+        self.files = files
+        self.path = path
+        self.prefetched = list()
+    
+    def stat(self):
+        return TestObj.stat(len(self.getvalue()))
+    
+    def prefetch(self, file_size=None):
+        self.prefetched.append((self.tell(), file_size))
+    
+    def set_pipelined(self, pipelined=True):
+        pass
+    
+    def close(self):
+        self.files[self.path] = self.getvalue()
+
+class SFTPClient(object):
+    
+    """Stand-in for paramiko.SFTPClient backed by a dict of file contents."""
+    
+    def __init__(self, files):
+        self.files = files
+        self.opened = list()
+    
+    def stat(self, path):
+        if path not in self.files:
+            raise IOError(2, 'No such file')
+        return TestObj.stat(len(self.files[path]))
+    
+    def open(self, path, mode='r'):
+        if mode != 'w' and path not in self.files:
+            raise IOError(2, 'No such file')
+        f = SFTPFile(self.files, path, mode)
+        self.opened.append(f)
+        return f
+    
+    def close(self):
+        pass